@@ -1,17 +1,24 @@
+import time
+script_started = time.perf_counter()
+
 import streamlit as st
-import requests
 import pandas as pd
 import json
-import re
-from collections import Counter
-import time
 from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import io
-import base64
+
+from corpus import SEARCH_LIMIT, get_corpus
+from crawl import LONG_TAIL
+from exports import FORMATS as EXPORT_FORMATS, export_bytes
+from jobs import DONE, get_queue
+from keyword_engine import ANALYSIS_PLANS, DEFAULT_CONCURRENCY, cache, plan_budget
+from markets import MarketRun
+from metrics import metrics
+from results import ResearchRun, RunStore
+from word_cloud import render_async
+
+# plotly.express is imported inside the functions that draw, and word_cloud only
+# loads wordcloud to render, so the welcome screen and every fresh worker start without them
+# (python benchmark.py measures the cold start against a budget)
 
 st.set_page_config(
     page_title="Advanced Keyword Research Tool",
@@ -65,160 +72,33 @@ COUNTRY_TO_GL = {
 }
 
 # ────────────────────────────
-## 3. Enhanced Modifier Categories
-# ────────────────────────────
-QUESTION_WORDS = ["what", "why", "how", "where", "when", "who", "which", "can", "will", "are", "is", "does", "do", "should", "would", "could"]
-PREPOSITIONS = ["for", "with", "without", "to", "near", "in", "on", "about", "versus", "vs", "from", "by", "at", "through", "during", "after", "before"]
-COMPARISONS = ["vs", "versus", "alternative", "alternatives", "compare", "comparison", "like", "similar", "better than", "instead of", "rather than"]
-INTENT_MODIFIERS = ["buy", "purchase", "cheap", "best", "review", "price", "cost", "free", "download", "tutorial", "guide", "tips", "how to"]
-TEMPORAL = ["2024", "2025", "latest", "new", "today", "now", "recent", "upcoming", "future", "trends"]
-
+## 3. Enhanced Helper Functions
 # ────────────────────────────
-## 4. Enhanced Helper Functions
-# ────────────────────────────
-@st.cache_data(show_spinner=False, ttl=3600)
-def google_autocomplete(query: str, gl: str) -> list[str]:
-    url = "https://suggestqueries.google.com/complete/search"
-    params = {"client": "firefox", "q": query, "gl": gl, "hl": "en"}
-    try:
-        r = requests.get(url, params=params, timeout=5)
-        r.raise_for_status()
-        suggestions = r.json()[1]
-        return suggestions
-    except Exception:
-        return []
-
-@st.cache_data(show_spinner=False, ttl=3600)
-def get_related_searches(query: str, gl: str) -> list[str]:
-    """Get related searches using alphabet soup method"""
-    related = []
-    alphabet = "abcdefghijklmnopqrstuvwxyz"
-    
-    for letter in alphabet[:10]:  # Limit to first 10 letters for performance
-        suggestions = google_autocomplete(f"{query} {letter}", gl)
-        related.extend(suggestions)
-    
-    return list(set(related))[:50]  # Limit and dedupe
-
-def analyze_keyword_difficulty(keywords: list[str]) -> dict:
-    """Simple keyword difficulty analysis based on length and common words"""
-    difficulty_scores = {}
-    common_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by", "from", "about"}
-    
-    for keyword in keywords:
-        words = keyword.lower().split()
-        # Simple scoring: longer phrases = easier, common words = harder
-        score = max(1, len(words) * 10 - len([w for w in words if w in common_words]) * 5)
-        score = min(100, max(1, score))  # Cap between 1-100
-        
-        if score <= 30:
-            difficulty = "Easy"
-        elif score <= 60:
-            difficulty = "Medium"
-        else:
-            difficulty = "Hard"
-            
-        difficulty_scores[keyword] = {"score": score, "difficulty": difficulty}
-    
-    return difficulty_scores
-
-def extract_search_volume_indicators(keywords: list[str]) -> dict:
-    """Extract search volume indicators from keyword characteristics"""
-    volume_indicators = {}
-    
-    for keyword in keywords:
-        # Simple heuristics based on keyword characteristics
-        words = keyword.lower().split()
-        score = 50  # Base score
-        
-        # Brand terms typically have higher volume
-        if any(word in keyword.lower() for word in ["google", "facebook", "amazon", "apple", "microsoft"]):
-            score += 30
-        
-        # Question keywords often have good volume
-        if any(word in words for word in ["what", "how", "why", "where", "when"]):
-            score += 20
-        
-        # Commercial intent
-        if any(word in words for word in ["buy", "price", "cost", "cheap", "best", "review"]):
-            score += 25
-        
-        # Length penalty
-        if len(words) > 4:
-            score -= 10
-        
-        score = max(10, min(100, score))
-        volume_indicators[keyword] = score
-    
-    return volume_indicators
-
-def expand_keyword(seed: str, gl: str) -> dict[str, list[str]]:
-    buckets = {
-        "Questions": [], 
-        "Prepositions": [], 
-        "Comparisons": [],
-        "Commercial Intent": [],
-        "Temporal": [],
-        "Related Searches": []
-    }
-
-    # Original categories
-    for q in QUESTION_WORDS:
-        buckets["Questions"] += google_autocomplete(f"{q} {seed}", gl)
-
-    for p in PREPOSITIONS:
-        buckets["Prepositions"] += google_autocomplete(f"{seed} {p}", gl)
-        buckets["Prepositions"] += google_autocomplete(f"{p} {seed}", gl)
-
-    for c in COMPARISONS:
-        buckets["Comparisons"] += google_autocomplete(f"{seed} {c}", gl)
-
-    # New categories
-    for intent in INTENT_MODIFIERS:
-        buckets["Commercial Intent"] += google_autocomplete(f"{intent} {seed}", gl)
-        buckets["Commercial Intent"] += google_autocomplete(f"{seed} {intent}", gl)
-
-    for temporal in TEMPORAL:
-        buckets["Temporal"] += google_autocomplete(f"{seed} {temporal}", gl)
-
-    # Related searches
-    buckets["Related Searches"] = get_related_searches(seed, gl)
-
-    # Deduplicate all buckets
-    for key in buckets:
-        seen = set()
-        unique = []
-        for s in buckets[key]:
-            if s and s.lower() not in seen and len(s.strip()) > 0:
-                unique.append(s)
-                seen.add(s.lower())
-        buckets[key] = unique[:100]  # Limit per category
-
-    return buckets
+def show_wordcloud(run: ResearchRun):
+    """The run's word cloud: at once if it was rendered before, otherwise drawn in the background"""
+    frequencies = run.word_frequencies
+    if not frequencies:
+        return
+    cloud = render_async(frequencies)
+    if not cloud.done():
+        wait_for_wordcloud(frequencies)
+    elif cloud.exception() is not None:
+        st.warning(f"Could not draw the word cloud: {cloud.exception()}")
+        if st.button("🔄 Retry Word Cloud"):
+            render_async(frequencies, retry=True)
+            st.rerun()
+    else:
+        st.image(cloud.result(), use_container_width=True)
 
-def generate_wordcloud(text_data: list[str]) -> str:
-    """Generate word cloud from keywords"""
-    if not text_data:
-        return None
-    
-    text = " ".join(text_data)
-    wordcloud = WordCloud(width=800, height=400, background_color='white', 
-                         colormap='viridis', max_words=100).generate(text)
-    
-    # Save to bytes
-    img_buffer = io.BytesIO()
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
-    plt.close()
-    
-    img_buffer.seek(0)
-    img_str = base64.b64encode(img_buffer.getvalue()).decode()
-    return img_str
+@st.fragment(run_every=0.5)
+def wait_for_wordcloud(frequencies: dict[str, int]):
+    """Placeholder while the cloud renders, so the tables below are not held up; reruns the page when ready"""
+    if render_async(frequencies).done():
+        st.rerun()
+    st.caption("☁️ Drawing word cloud...")
 
 # ────────────────────────────
-## 5. Enhanced Sidebar
+## 4. Enhanced Sidebar
 # ────────────────────────────
 with st.sidebar:
     st.header("🔧 Advanced Settings")
@@ -230,6 +110,11 @@ with st.sidebar:
         index=list(COUNTRY_TO_GL.keys()).index("India"),
         help="Geographic targeting for keyword suggestions",
     )
+    compare_with = st.multiselect(
+        "🌐 Compare With Markets",
+        options=[c for c in COUNTRY_TO_GL if c != country],
+        help="Run the same seeds in these markets at the same time and compare which keywords each market gets",
+    )
     
     st.markdown("---")
     
@@ -238,7 +123,18 @@ with st.sidebar:
         include_volume = st.checkbox("📊 Include Volume Indicators", value=True)
         include_difficulty = st.checkbox("🎯 Include Difficulty Analysis", value=True)
         include_wordcloud = st.checkbox("☁️ Generate Word Cloud", value=True)
+        show_diagnostics = st.checkbox("🩺 Show Diagnostics", value=False,
+                                       help="Query latency, errors, cache hit ratio and stage timings since the app started or the last reset")
         max_suggestions = st.slider("Max suggestions per category", 20, 200, 100)
+        concurrency = st.slider("Parallel requests", 1, 32, DEFAULT_CONCURRENCY,
+                                help="Autocomplete queries fetched at the same time")
+        crawl_depth = st.slider("🕸️ Crawl depth", 0, 3, 0,
+                                help="Feed suggestions back in as new queries to reach long-tail keywords (0 = off)")
+        query_budget = st.number_input("Query budget per seed", 100, 5000, 500, step=100,
+                                       disabled=crawl_depth == 0)
+        refresh_days = st.number_input("🔄 Refresh: reuse suggestions fetched within (days)", 0,
+                                       int(cache.retain // 86400), 0,
+                                       help="Re-query only suggestions older than this, to re-run a seed list cheaply (0 = off, use the 1-hour cache)")
     
     st.markdown("---")
     
@@ -252,56 +148,66 @@ with st.sidebar:
     # Analysis type
     analysis_type = st.selectbox(
         "🔍 Analysis Type",
-        ["Complete Analysis", "Quick Suggestions", "Competitor Research", "Content Ideas"],
-        help="Choose the depth of analysis"
+        list(ANALYSIS_PLANS),
+        help="Choose the depth of analysis: Quick sends a small high-yield subset, Competitor Research "
+             "focuses on comparisons and alternatives, Content Ideas on questions and prepositions"
     )
+    st.caption(f"Up to {plan_budget(analysis_type)} queries per seed per market")
     
     go_btn = st.button("🚀 Generate Research", use_container_width=True, type="primary")
+    
+    st.markdown("---")
+    
+    # Every keyword found by earlier runs
+    corpus_query = st.text_input(
+        "🗄️ Search Keyword Corpus",
+        placeholder="e.g. best running sh",
+        help="Keywords from all past runs containing every word; the last word also matches as a prefix",
+    )
 
 # ────────────────────────────
-## 6. Main Application Logic
+## 5. Result Rendering
 # ────────────────────────────
-if go_btn:
-    seed_list = [s.strip() for s in seeds.splitlines() if s.strip()][:10]
-    if not seed_list:
-        st.error("Please enter at least one seed keyword 🌱")
-        st.stop()
-
-    # Progress tracking
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    with st.spinner("🔄 Analyzing keywords and generating insights..."):
-        all_rows = []
-        tab_dfs = {
-            "Questions": [], "Prepositions": [], "Comparisons": [],
-            "Commercial Intent": [], "Temporal": [], "Related Searches": []
-        }
-        gl_code = COUNTRY_TO_GL[country]
-        
-        total_seeds = len(seed_list)
-        
-        for i, seed in enumerate(seed_list):
-            status_text.text(f"Processing: {seed} ({i+1}/{total_seeds})")
-            progress_bar.progress((i + 1) / total_seeds)
-            
-            buckets = expand_keyword(seed, gl_code)
-            
-            for bucket_name, suggestions in buckets.items():
-                for s in suggestions[:max_suggestions]:
-                    row = {"Seed": seed, "Category": bucket_name, "Keyword": s, "Length": len(s.split())}
-                    all_rows.append(row)
-                    tab_dfs[bucket_name].append(row)
-            
-            time.sleep(0.1)  # Prevent rate limiting
-
-        master_df = pd.DataFrame(all_rows)
-        progress_bar.empty()
-        status_text.empty()
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id: str):
+    """Poll a background job once a second; the whole page reruns when it finishes"""
+    import plotly.express as px
+    job = queue.get(job_id)
+    if job.finished:
+        st.rerun()
+    st.progress(job.seeds_done / job.total)
+    status = f"{job.status.title()} · {job.seeds_done}/{job.total} seeds · {time.time() - job.created:.0f}s"
+    st.text(status + (f" · fetching: {job.current}" if job.current else ""))
+    preview = job.preview()
+    if len(preview):
+        st.caption(f"{len(preview):,} keywords so far")
+        counts = preview["Category"].value_counts()
+        fig = px.bar(x=counts.values, y=counts.index, orientation='h', title="Keywords by Category (live)")
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(preview[['Keyword', 'Category', 'Seed', 'Length']],
+                     hide_index=True, height=300, use_container_width=True)
+    if st.button("⏹️ Stop Research", key=f"stop_{job_id}"):
+        job.cancel()
+
+def render_dashboard(run: ResearchRun):
+    """Render a stored run; reruns (filters, toggles) never re-fetch"""
+    import plotly.express as px
+    seed_list = run.seeds
+    master_df = run.frame
+    planner = run.planner
+    crawl_stats = run.crawl
 
     # ── Analytics Dashboard
     if not master_df.empty:
         st.success(f"✨ Generated {len(master_df):,} unique keyword suggestions from {len(seed_list)} seeds")
+        if planner and planner["saved"]:
+            st.caption(f"♻️ Query planner skipped {planner['saved']:,} duplicate requests "
+                       f"({planner['issued']:,} of {planner['planned']:,} sent)")
+        if crawl_stats:
+            spent = sum(c.queries for c in crawl_stats.values())
+            found = sum(c.keywords for c in crawl_stats.values())
+            st.caption(f"🕸️ Crawl spent {spent:,} queries to find {found:,} keywords "
+                       f"({found / max(spent, 1):.1f} per query)")
         
         # Key Metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -317,63 +223,67 @@ if go_btn:
             categories = master_df['Category'].nunique()
             st.metric("Categories", categories)
 
-        # Enhanced Analysis
-        if include_difficulty or include_volume:
-            st.markdown("### 📊 Keyword Analysis")
-            
-            analysis_df = master_df.copy()
-            
-            if include_difficulty:
-                with st.spinner("Analyzing keyword difficulty..."):
-                    difficulty_data = analyze_keyword_difficulty(master_df['Keyword'].tolist())
-                    analysis_df['Difficulty'] = analysis_df['Keyword'].map(lambda x: difficulty_data.get(x, {}).get('difficulty', 'Medium'))
-                    analysis_df['Difficulty_Score'] = analysis_df['Keyword'].map(lambda x: difficulty_data.get(x, {}).get('score', 50))
-            
-            if include_volume:
-                with st.spinner("Estimating search volume indicators..."):
-                    volume_data = extract_search_volume_indicators(master_df['Keyword'].tolist())
-                    analysis_df['Volume_Indicator'] = analysis_df['Keyword'].map(lambda x: volume_data.get(x, 50))
+        if run.changes is not None:
+            render_changes(run)
+
+        with metrics.stage("charting"):
+            # Enhanced Analysis (scores are computed once when the run is stored)
+            if include_difficulty or include_volume:
+                st.markdown("### 📊 Keyword Analysis")
+                analysis_df = master_df
 
-            # Visualizations
-            viz_col1, viz_col2 = st.columns(2)
+                # Visualizations
+                viz_col1, viz_col2 = st.columns(2)
             
-            with viz_col1:
-                if include_difficulty:
-                    fig_diff = px.histogram(analysis_df, x='Difficulty', title="Keyword Difficulty Distribution",
-                                          color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1'])
-                    st.plotly_chart(fig_diff, use_container_width=True)
+                with viz_col1:
+                    if include_difficulty:
+                        fig_diff = px.histogram(analysis_df, x='Difficulty', title="Keyword Difficulty Distribution",
+                                              color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1'])
+                        st.plotly_chart(fig_diff, use_container_width=True)
             
-            with viz_col2:
-                if include_volume:
-                    fig_vol = px.box(analysis_df, y='Volume_Indicator', title="Volume Indicator Distribution",
-                                   color_discrete_sequence=['#96ceb4'])
-                    st.plotly_chart(fig_vol, use_container_width=True)
-
-        # Category Distribution
-        st.markdown("### 📈 Category Analysis")
-        category_counts = master_df['Category'].value_counts()
+                with viz_col2:
+                    if include_volume:
+                        fig_vol = px.box(analysis_df, y='Volume_Indicator', title="Volume Indicator Distribution",
+                                       color_discrete_sequence=['#96ceb4'])
+                        st.plotly_chart(fig_vol, use_container_width=True)
+
+            # Category Distribution
+            st.markdown("### 📈 Category Analysis")
+            category_counts = master_df['Category'].value_counts()
         
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            fig_cat = px.bar(x=category_counts.values, y=category_counts.index, 
-                           orientation='h', title="Keywords by Category",
-                           color=category_counts.values, color_continuous_scale='viridis')
-            fig_cat.update_layout(showlegend=False)
-            st.plotly_chart(fig_cat, use_container_width=True)
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                fig_cat = px.bar(x=category_counts.values, y=category_counts.index, 
+                               orientation='h', title="Keywords by Category",
+                               color=category_counts.values, color_continuous_scale='viridis')
+                fig_cat.update_layout(showlegend=False)
+                st.plotly_chart(fig_cat, use_container_width=True)
         
-        with col2:
-            fig_pie = px.pie(values=category_counts.values, names=category_counts.index,
-                           title="Category Distribution")
-            st.plotly_chart(fig_pie, use_container_width=True)
-
-        # Word Cloud
-        if include_wordcloud:
-            st.markdown("### ☁️ Keyword Word Cloud")
-            with st.spinner("Generating word cloud..."):
-                wordcloud_img = generate_wordcloud(master_df['Keyword'].tolist())
-                if wordcloud_img:
-                    st.markdown(f'<img src="data:image/png;base64,{wordcloud_img}" style="width:100%">', 
-                              unsafe_allow_html=True)
+            with col2:
+                fig_pie = px.pie(values=category_counts.values, names=category_counts.index,
+                               title="Category Distribution")
+                st.plotly_chart(fig_pie, use_container_width=True)
+
+            # Word Cloud
+            if include_wordcloud:
+                st.markdown("### ☁️ Keyword Word Cloud")
+                show_wordcloud(run)
+
+        # Keyword Clusters
+        if 'Cluster' in master_df:
+            st.markdown("### 🧩 Keyword Clusters")
+            # Clusters are per seed: a keyword found for two seeds belongs to one cluster of each
+            unique_keywords = master_df.drop_duplicates(['Seed', 'Keyword'])
+            sizes = unique_keywords['Cluster'].value_counts()
+            grouped = sizes[sizes > 1]
+            st.caption(f"{len(sizes):,} clusters · {grouped.sum():,} keywords grouped with near-duplicates")
+            # Cluster ids are numbered from the largest cluster down
+            top_clusters = (unique_keywords[unique_keywords['Cluster'].isin(grouped.index[:50])]
+                            .groupby('Cluster', observed=True)
+                            .agg(Seed=('Seed', 'first'), Canonical=('Cluster_Keyword', 'first'),
+                                 Keywords=('Keyword', 'size'),
+                                 Examples=('Keyword', lambda k: ", ".join(k.astype(str).head(5)))))
+            st.dataframe(top_clusters, hide_index=True, use_container_width=True)
 
         # ── Enhanced Tabs with Filtering
         st.markdown("### 🔍 Detailed Results")
@@ -381,110 +291,101 @@ if go_btn:
         # Filters
         filter_col1, filter_col2, filter_col3 = st.columns(3)
         with filter_col1:
-            seed_filter = st.multiselect("Filter by Seed", master_df['Seed'].unique())
+            seed_filter = st.multiselect("Filter by Seed", list(run.indexes['Seed']), key=f"seed_filter_{run.run_id}")
         with filter_col2:
-            length_filter = st.slider("Keyword Length", 1, int(master_df['Length'].max()), (1, int(master_df['Length'].max())))
+            max_length = max(2, int(master_df['Length'].max()))
+            length_filter = st.slider("Keyword Length", 1, max_length, (1, max_length), key=f"length_filter_{run.run_id}")
         with filter_col3:
+            diff_filter = []
             if include_difficulty:
-                diff_filter = st.multiselect("Filter by Difficulty", ['Easy', 'Medium', 'Hard'])
-
-        # Apply filters
-        filtered_df = master_df.copy()
-        if seed_filter:
-            filtered_df = filtered_df[filtered_df['Seed'].isin(seed_filter)]
-        filtered_df = filtered_df[
-            (filtered_df['Length'] >= length_filter[0]) & 
-            (filtered_df['Length'] <= length_filter[1])
-        ]
-        if include_difficulty and diff_filter:
-            filtered_df = filtered_df[filtered_df['Difficulty'].isin(diff_filter)]
+                diff_filter = st.multiselect("Filter by Difficulty", ['Easy', 'Medium', 'Hard'], key=f"diff_filter_{run.run_id}")
+
+        # Apply filters through the run's precomputed indexes
+        filters = {"seeds": seed_filter, "difficulty": diff_filter, "length": length_filter}
+        filtered_df = run.filter(**filters)
 
         # Enhanced Tabs
         tabs = st.tabs(["🔥 All Results", "❓ Questions", "⚙️ Prepositions", "🔄 Comparisons", 
-                       "💰 Commercial", "📅 Temporal", "🔗 Related"])
+                       "💰 Commercial", "📅 Temporal", "🔗 Related"] + (["🌿 Long Tail"] if LONG_TAIL in run.categories else []))
         
         # All Results Tab
         with tabs[0]:
-            display_cols = ['Keyword', 'Category', 'Seed', 'Length']
+            display_cols = ['Keyword', 'Category', 'Seed', 'Length'] + (['Cluster_Keyword'] if 'Cluster' in master_df else [])
             if include_difficulty:
                 display_cols.extend(['Difficulty', 'Difficulty_Score'])
             if include_volume:
                 display_cols.append('Volume_Indicator')
             
+            st.caption(f"Showing {len(filtered_df):,} of {len(master_df):,} keywords")
             st.dataframe(
-                analysis_df[display_cols] if 'analysis_df' in locals() else filtered_df[['Keyword', 'Category', 'Seed', 'Length']],
+                filtered_df[display_cols],
                 hide_index=True,
                 height=500,
                 use_container_width=True,
                 column_config={
                     "Keyword": st.column_config.TextColumn("Keyword", width="large"),
+                    "Cluster_Keyword": st.column_config.TextColumn("Cluster"),
                     "Difficulty_Score": st.column_config.ProgressColumn("Difficulty Score", min_value=0, max_value=100),
                     "Volume_Indicator": st.column_config.ProgressColumn("Volume Indicator", min_value=0, max_value=100),
                 }
             )
         
         # Individual category tabs
-        for i, (tab, category) in enumerate(zip(tabs[1:], tab_dfs.keys())):
+        for i, (tab, category) in enumerate(zip(tabs[1:], run.categories)):
             with tab:
-                if tab_dfs[category]:
-                    cat_df = pd.DataFrame(tab_dfs[category])
+                cat_df = run.filter(categories=[category], **filters)
+                if not cat_df.empty:
                     display_cols = ['Keyword', 'Seed']
-                    
-                    if include_difficulty and 'analysis_df' in locals():
-                        cat_analysis = analysis_df[analysis_df['Category'] == category]
-                        if not cat_analysis.empty:
-                            st.dataframe(
-                                cat_analysis[['Keyword', 'Seed', 'Difficulty', 'Difficulty_Score'] + 
-                                           (['Volume_Indicator'] if include_volume else [])],
-                                hide_index=True,
-                                height=400,
-                                use_container_width=True,
-                            )
-                        else:
-                            st.dataframe(cat_df[display_cols], hide_index=True, height=400, use_container_width=True)
-                    else:
-                        st.dataframe(cat_df[display_cols], hide_index=True, height=400, use_container_width=True)
+                    if include_difficulty:
+                        display_cols.extend(['Difficulty', 'Difficulty_Score'])
+                    if include_volume:
+                        display_cols.append('Volume_Indicator')
+                    st.dataframe(cat_df[display_cols], hide_index=True, height=400, use_container_width=True)
                     
                     # Category-specific insights
-                    st.info(f"💡 Found {len(tab_dfs[category])} {category.lower()} keywords")
+                    st.info(f"💡 Found {len(cat_df)} {category.lower()} keywords")
                 else:
                     st.info(f"No {category.lower()} keywords found for your seeds.")
 
         # ── Enhanced Export Options
         st.markdown("### ⬇️ Export Options")
         
+        # Files are only generated when a button is clicked, then cached per run and content
+        export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"export_format_{run.run_id}")
+        extension, mime = EXPORT_FORMATS[export_format]
+        stamp = datetime.now().strftime('%Y%m%d_%H%M')
+        score_cols = (['Difficulty', 'Difficulty_Score'] if include_difficulty else []) + (['Volume_Indicator'] if include_volume else [])
+        base_cols = ['Seed', 'Category', 'Keyword', 'Length'] + (['Cluster', 'Cluster_Keyword'] if 'Cluster' in master_df else [])
+        
         export_col1, export_col2, export_col3 = st.columns(3)
         
         with export_col1:
-            csv_data = analysis_df if 'analysis_df' in locals() else master_df
-            csv_bytes = csv_data.to_csv(index=False).encode("utf-8")
             st.download_button(
-                "📄 Download Full CSV",
-                csv_bytes,
-                f"keyword_research_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                "text/csv",
+                f"📄 Download Full {export_format}",
+                lambda: export_bytes(master_df[base_cols + score_cols],
+                                     export_format, run.run_id, "full"),
+                f"keyword_research_{stamp}{extension}",
+                mime,
                 use_container_width=True,
             )
         
         with export_col2:
             # Top keywords only
-            top_keywords = master_df.groupby('Category').head(20)
-            top_csv = top_keywords.to_csv(index=False).encode("utf-8")
             st.download_button(
                 "⭐ Download Top Keywords",
-                top_csv,
-                f"top_keywords_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                "text/csv",
+                lambda: export_bytes(master_df[base_cols].groupby('Category', observed=True).head(20),
+                                     export_format, run.run_id, "top"),
+                f"top_keywords_{stamp}{extension}",
+                mime,
                 use_container_width=True,
             )
         
         with export_col3:
             # JSON export for developers
-            json_data = master_df.to_json(orient='records', indent=2)
             st.download_button(
                 "🔧 Download JSON",
-                json_data.encode("utf-8"),
-                f"keywords_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                lambda: master_df[base_cols].to_json(orient='records', indent=2).encode("utf-8"),
+                f"keywords_{stamp}.json",
                 "application/json",
                 use_container_width=True,
             )
@@ -503,7 +404,7 @@ if go_btn:
             
             **Next Steps:**
             1. Filter keywords by difficulty and volume indicators
-            2. Group similar keywords for content planning
+            2. Plan content around keyword clusters rather than single keywords
             3. Analyze competitor keywords in your niche
             4. Create content around high-opportunity keywords
             """)
@@ -514,6 +415,197 @@ if go_btn:
     else:
         st.error("No keywords were generated. Please try different seed keywords.")
 
+def render_changes(run: ResearchRun):
+    """Delta against the previous snapshot of the same seeds and market"""
+    changes = run.changes
+    st.markdown(f"### 📈 Changes Since {changes.previous}")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("New Suggestions", f"{changes.counts['new']:,}")
+    with col2:
+        st.metric("Dropped Suggestions", f"{changes.counts['dropped']:,}")
+    with col3:
+        st.metric("Rank Changes", f"{changes.counts['moved']:,}")
+    shown = st.multiselect("Show", ["new", "dropped", "moved"], default=["new", "dropped"],
+                           key=f"changes_filter_{run.run_id}")
+    delta = changes.frame[changes.frame['Change'].isin(shown)]
+    st.dataframe(delta, hide_index=True, height=300, use_container_width=True,
+                 column_config={"Rank_Change": st.column_config.NumberColumn("Rank Change", help="Positive = moved up")})
+    st.download_button("📄 Download Changes CSV",
+                       lambda: delta.to_csv(index=False).encode("utf-8"),
+                       f"keyword_changes_{changes.previous}_{changes.current}.csv", "text/csv")
+
+def render_markets(market_run: MarketRun):
+    """Compare the markets of a multi-market run, then drill into one of them"""
+    import plotly.express as px
+    matrix = market_run.matrix
+    st.markdown("### 🌐 Market Comparison")
+    shared = int((matrix['Markets'] == len(market_run.gls)).sum())
+    unique_counts = matrix['Unique_To'].value_counts().reindex(market_run.gls, fill_value=0)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Markets", len(market_run.gls))
+    with col2:
+        st.metric("Distinct Keywords", f"{len(matrix):,}")
+    with col3:
+        st.metric("In Every Market", f"{shared:,}")
+    
+    fig_unique = px.bar(x=unique_counts.index, y=unique_counts.values, title="Keywords Unique to Each Market",
+                        labels={'x': 'Market', 'y': 'Keywords'})
+    st.plotly_chart(fig_unique, use_container_width=True)
+    
+    view = st.radio("Show", ["All keywords", "Unique to one market", "In every market"], horizontal=True,
+                    key=f"market_view_{market_run.run_id}")
+    if view == "Unique to one market":
+        market = st.selectbox("Market", market_run.gls, key=f"unique_market_{market_run.run_id}")
+        shown = matrix.loc[market_run.unique_to(market)]
+    elif view == "In every market":
+        shown = matrix[matrix['Markets'] == len(market_run.gls)]
+    else:
+        shown = matrix
+    st.caption(f"Showing {len(shown):,} of {len(matrix):,} keywords")
+    st.dataframe(shown, height=400, use_container_width=True)
+    
+    export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"market_export_format_{market_run.run_id}")
+    extension, mime = EXPORT_FORMATS[export_format]
+    st.download_button(
+        "🌐 Download Market Matrix",
+        lambda: export_bytes(matrix.reset_index(), export_format, market_run.run_id, "markets"),
+        f"market_matrix_{datetime.now():%Y%m%d_%H%M}{extension}",
+        mime,
+    )
+    
+    st.markdown("---")
+    detail = st.selectbox("🔎 Market Details", market_run.gls, key=f"market_detail_{market_run.run_id}")
+    render_dashboard(market_run.runs[detail])
+
+def render_diagnostics():
+    """Process-wide instrumentation (see metrics.py), with Prometheus and JSON dumps"""
+    import plotly.express as px
+    data = metrics.as_dict(cache.stats)
+    latency = data['query_latency_seconds']
+    outcomes = data['outcomes']
+    failed = sum(n for outcome, n in outcomes.items() if outcome not in ("ok", "empty"))
+    
+    with st.expander("🩺 Diagnostics", expanded=True):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Network Queries", f"{latency['count']:,}")
+        with col2:
+            st.metric("Failed", f"{failed:,}", help="Errors, including empty results returned after an error")
+        with col3:
+            st.metric("Cache Hit Ratio", f"{data['cache']['hit_ratio']:.0%}")
+        with col4:
+            st.metric("Latency p50 / p95", f"≤{latency['p50']}s / ≤{latency['p95']}s")
+        
+        diag_col1, diag_col2 = st.columns(2)
+        with diag_col1:
+            st.plotly_chart(px.bar(x=list(latency['buckets']), y=list(latency['buckets'].values()),
+                                   labels={'x': 'Latency ≤ (s)', 'y': 'Queries'}, title="Query Latency"),
+                            use_container_width=True)
+            st.dataframe(pd.DataFrame(data['stages']).T.rename_axis('Stage'), use_container_width=True)
+        with diag_col2:
+            st.dataframe(pd.Series(outcomes, name='Queries', dtype=int).rename_axis('Outcome'), use_container_width=True)
+            st.dataframe(pd.Series(data['retries'], name='Retries', dtype=int).rename_axis('Reason'), use_container_width=True)
+            st.dataframe(pd.Series(data['buckets'], name='Planned Queries', dtype=int).rename_axis('Bucket'), use_container_width=True)
+        st.dataframe(pd.Series(data['seeds'], name='Planned Queries', dtype=int).rename_axis('Seed').tail(20),
+                     use_container_width=True)
+        
+        dl_col1, dl_col2, dl_col3 = st.columns(3)
+        with dl_col1:
+            st.download_button("📈 Prometheus Metrics", lambda: metrics.to_prometheus(cache.stats),
+                               "metrics.prom", "text/plain; version=0.0.4", use_container_width=True)
+        with dl_col2:
+            st.download_button("🔧 Metrics JSON", lambda: json.dumps(metrics.as_dict(cache.stats), indent=2),
+                               "metrics.json", "application/json", use_container_width=True)
+        with dl_col3:
+            if st.button("♻️ Reset Metrics", use_container_width=True):
+                metrics.reset()
+                cache.stats.reset()
+                st.rerun()
+
+def render_corpus_search(query: str):
+    """Matches from the keyword corpus of all past runs (see corpus.py)"""
+    corpus = get_corpus()
+    started = time.perf_counter()
+    matches = corpus.search(query)
+    elapsed = time.perf_counter() - started
+    with st.expander(f"🗄️ Keyword Corpus: {len(matches):,} matches for “{query}”", expanded=True):
+        st.caption(f"Newest first, up to {SEARCH_LIMIT} shown · {len(corpus):,} keywords indexed · {elapsed * 1000:.0f} ms")
+        if matches.empty:
+            st.info("No keyword found by a past run contains all of these words.")
+            return
+        st.dataframe(matches, hide_index=True, height=300, use_container_width=True,
+                     column_config={"First_Seen": st.column_config.DatetimeColumn("First Seen"),
+                                    "Last_Seen": st.column_config.DatetimeColumn("Last Seen")})
+        st.download_button("📄 Download Matches CSV", lambda: matches.to_csv(index=False).encode("utf-8"),
+                           "keyword_corpus_matches.csv", "text/csv")
+
+# ────────────────────────────
+## 6. Main Application Logic
+# ────────────────────────────
+store = st.session_state.setdefault("run_store", RunStore())
+queue = get_queue()
+
+if corpus_query.strip():
+    render_corpus_search(corpus_query.strip())
+
+if go_btn:
+    seed_list = [s.strip() for s in seeds.splitlines() if s.strip()][:10]
+    if not seed_list:
+        st.error("Please enter at least one seed keyword 🌱")
+        st.stop()
+
+    # The run happens in a background worker; the page only keeps the job id
+    # (in the URL, so a refresh or a new tab picks the job up again)
+    markets = [COUNTRY_TO_GL[country]] + [COUNTRY_TO_GL[c] for c in compare_with]
+    if len(markets) > 1 and crawl_depth:
+        st.info("🕸️ Crawl depth applies to single-market research; comparing markets uses the standard query plan.")
+    job = queue.submit({
+        "seeds": seed_list, "gls": markets, "max_suggestions": max_suggestions, "concurrency": concurrency,
+        "crawl_depth": crawl_depth if len(markets) == 1 else 0, "query_budget": query_budget,
+        "max_age": refresh_days * 86400 or None, "analysis": analysis_type,
+    })
+    st.query_params["job"] = job.id
+
+job = queue.get(st.query_params["job"]) if "job" in st.query_params else None
+if job is not None and job.finished and job.run.complete and store.runs.get(job.id) is not job.run:
+    store.add(job.run)
+
+if job is not None and not job.finished:
+    render_job_progress(job.id)
+
+elif job is not None and not job.run.complete:
+    st.error(f"❌ The results could not be built ({job.error}).")
+    if st.button("▶️ Resume Research", help="Continue from the last finished seed; finished seeds are not fetched again"):
+        queue.resume(job.id)
+        st.rerun()
+
+elif store.get() is not None:
+    if len(store) > 1:
+        with st.sidebar:
+            st.markdown("---")
+            labels = {f"{', '.join(r.seeds)[:40]} · {r.gl} · {datetime.fromtimestamp(r.created):%H:%M} · #{run_id[:4]}": run_id
+                      for run_id, r in reversed(store.runs.items())}
+            active = store.active if job is None else job.id
+            choice = st.selectbox("🗂️ Previous Runs", list(labels), index=list(labels.values()).index(active))
+            store.active = labels[choice]
+            st.query_params["job"] = store.active
+    run = store.get()
+    run_job = queue.get(run.run_id)
+    if run_job is not None and run_job.status != DONE:
+        reason = f"Google kept throttling requests ({run_job.error})" if run_job.error else "The run was stopped"
+        st.warning(f"⏹️ {reason}, so only the {len(run):,} keywords from seeds that finished are shown.")
+        if st.button("▶️ Resume Research", help="Continue from the last finished seed; finished seeds are not fetched again"):
+            queue.resume(run_job.id)
+            st.query_params["job"] = run_job.id
+            st.rerun()
+    if isinstance(run, MarketRun):
+        render_markets(run)
+    else:
+        render_dashboard(run)
+
 else:
     # Welcome screen with instructions
     st.info("👈 Enter your seed keywords in the sidebar and click **Generate Research** to start your free keyword research!")
@@ -553,4 +645,8 @@ else:
         - Focus on commercial intent keywords for sales-driven content
         - Use question keywords for FAQ and blog content
         - Export data for further analysis in Excel/Google Sheets
-        """)
\ No newline at end of file
+        """)
+
+if show_diagnostics:
+    render_diagnostics()
+metrics.observe_stage("script_run", time.perf_counter() - script_started)
@@ -0,0 +1,183 @@
+"""Headless batch mode: expand and score seeds from a file or stdin.
+
+Rows are written as soon as each seed finishes, so memory stays flat no
+matter how many seeds go in.
+
+    python batch.py seeds.txt --gl US --format csv -o results.csv
+    cat seeds.txt | python batch.py - --format jsonl > results.jsonl
+    python batch.py seeds.txt --refresh 7 --changes changes.csv > results.jsonl  # weekly refresh
+    python batch.py seeds.txt --analysis "Quick Suggestions" > quick.jsonl
+
+``--snapshot`` (implied by ``--changes``) keeps each seed's ranked keywords
+until the end to save them as today's snapshot (see snapshots). ``--index``
+adds each seed's keywords to the keyword corpus searched from the app (see
+corpus).
+"""
+import argparse
+import csv
+import json
+import sys
+
+from corpus import get_corpus
+from crawl import crawl_keyword
+from keyword_engine import (ANALYSIS_PLANS, DEFAULT_ANALYSIS, DEFAULT_CONCURRENCY, QueryPlanner, SuggestError,
+                            bucket_rows, cache, expand_keywords)
+from metrics import metrics
+from scoring import score_keywords
+from snapshots import bucket_ranks, get_store as get_snapshots
+
+FIELDS = ["Seed", "Category", "Keyword", "Length", "Difficulty", "Difficulty_Score", "Volume_Indicator"]
+
+
+def read_seeds(stream):
+    """Yield non-empty, stripped lines without loading the whole file"""
+    for line in stream:
+        seed = line.strip()
+        if seed:
+            yield seed
+
+def score_rows(rows: list[dict]) -> list[dict]:
+    scores = score_keywords([row["Keyword"] for row in rows])
+    difficulty = scores["Difficulty"].to_dict()
+    difficulty_score = scores["Difficulty_Score"].to_dict()
+    volume = scores["Volume_Indicator"].to_dict()
+    for row in rows:
+        row["Difficulty"] = difficulty[row["Keyword"]]
+        row["Difficulty_Score"] = int(difficulty_score[row["Keyword"]])
+        row["Volume_Indicator"] = int(volume[row["Keyword"]])
+    return rows
+
+
+class JSONLWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, rows):
+        for row in rows:
+            self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+class CSVWriter:
+    def __init__(self, out):
+        self.out = out
+        self.writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.out.flush()
+
+
+WRITERS = {"jsonl": JSONLWriter, "csv": CSVWriter}
+
+
+def crawl_seeds(seeds, gl: str, depth: int, budget: int, concurrency: int, on_error, max_age: float = None,
+                analysis: str = DEFAULT_ANALYSIS):
+    for seed in seeds:
+        try:
+            buckets, _ = crawl_keyword(seed, gl, depth, budget, concurrency, max_age=max_age, analysis=analysis)
+        except SuggestError as e:
+            on_error(seed, e)
+            continue
+        yield seed, buckets
+
+def run(seeds, gl: str, writer, concurrency: int = DEFAULT_CONCURRENCY, max_suggestions: int = 100,
+        depth: int = 0, budget: int = 500, max_age: float = None, ranks: dict = None,
+        analysis: str = DEFAULT_ANALYSIS, corpus=None) -> dict:
+    """Stream every seed's scored rows to ``writer``; returns run totals.
+
+    ``max_age`` (seconds) reuses cached suggestions fetched within it. If
+    ``ranks`` is a dict, each seed's snapshot rows are collected into it.
+    ``analysis`` picks the query plan (see keyword_engine.ANALYSIS_PLANS).
+    Each seed's keywords are added to ``corpus`` (a KeywordCorpus) if given.
+    """
+    totals = {"seeds": 0, "rows": 0, "failed": 0}
+
+    def on_error(seed, exc):
+        totals["failed"] += 1
+        print(f"skipped {seed!r}: {exc}", file=sys.stderr)
+
+    if depth:
+        results = crawl_seeds(seeds, gl, depth, budget, concurrency, on_error, max_age, analysis)
+    else:
+        planner = QueryPlanner(max_age=max_age)
+        results = expand_keywords(seeds, gl, concurrency, on_error=on_error, planner=planner, analysis=analysis)
+    for seed, buckets in results:
+        with metrics.stage("scoring"):
+            rows = score_rows(bucket_rows(seed, buckets, max_suggestions))
+        with metrics.stage("export"):
+            writer.write(rows)
+        if ranks is not None:
+            ranks[seed] = list(bucket_ranks(seed, buckets, max_suggestions))
+        if corpus is not None:
+            corpus.add_rows(((row["Keyword"], seed, row["Category"]) for row in rows), gl)
+        totals["seeds"] += 1
+        totals["rows"] += len(rows)
+    if not depth:
+        totals["requests_saved"] = planner.saved
+    return totals
+
+def save_snapshot(ranks: dict, gl: str, totals: dict, changes_path: str = None, analysis: str = DEFAULT_ANALYSIS):
+    if totals["failed"]:
+        # Keywords of the failed seeds would all show up as dropped
+        print("snapshot not saved: some seeds failed", file=sys.stderr)
+        return
+    snapshots = get_snapshots()
+    seeds = list(ranks)
+    snapshots.save(seeds, gl, (row for rows in ranks.values() for row in rows), analysis=analysis)
+    changes = snapshots.changes(seeds, gl, analysis=analysis)
+    if changes is None:
+        print("snapshot saved; no earlier snapshot of these seeds to compare with", file=sys.stderr)
+        return
+    print(changes.summary(), file=sys.stderr)
+    if changes_path:
+        changes.frame.to_csv(changes_path, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch keyword research over a list of seeds")
+    parser.add_argument("seeds", nargs="?", default="-", help="file with one seed per line, '-' for stdin")
+    parser.add_argument("--gl", default="US", help="Google country code (default: US)")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    parser.add_argument("--analysis", choices=list(ANALYSIS_PLANS), default=DEFAULT_ANALYSIS,
+                        help="query plan and budget per seed (default: %(default)s)")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--max-suggestions", type=int, default=100, help="per category")
+    parser.add_argument("--depth", type=int, default=0, help="crawl depth for long-tail expansion (0 = off)")
+    parser.add_argument("--budget", type=int, default=500, help="max queries per seed when crawling")
+    parser.add_argument("--metrics", help="write run metrics here: Prometheus text for .prom/.txt, JSON otherwise")
+    parser.add_argument("--refresh", type=float, default=0, metavar="DAYS",
+                        help="reuse cached suggestions fetched within this many days; only older ones are re-queried")
+    parser.add_argument("--snapshot", action="store_true", help="save the results as today's snapshot of these seeds")
+    parser.add_argument("--changes", help="CSV file for new, dropped and moved keywords since the previous snapshot")
+    parser.add_argument("--index", action="store_true", help="add the keywords to the keyword corpus (CORPUS_DB)")
+    args = parser.parse_args(argv)
+    ranks = {} if args.snapshot or args.changes else None
+
+    seeds_in = sys.stdin if args.seeds == "-" else open(args.seeds, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        totals = run(read_seeds(seeds_in), args.gl, WRITERS[args.format](out),
+                     args.concurrency, args.max_suggestions, args.depth, args.budget,
+                     args.refresh * 86400 or None, ranks, args.analysis,
+                     get_corpus() if args.index else None)
+    finally:
+        if seeds_in is not sys.stdin:
+            seeds_in.close()
+        if out is not sys.stdout:
+            out.close()
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            if args.metrics.endswith((".prom", ".txt")):
+                f.write(metrics.to_prometheus(cache.stats))
+            else:
+                json.dump(metrics.as_dict(cache.stats), f, indent=2)
+    print(f"{totals['seeds']} seeds, {totals['rows']} rows, {totals['failed']} failed", file=sys.stderr)
+    if ranks is not None:
+        save_snapshot(ranks, args.gl, totals, args.changes, args.analysis)
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
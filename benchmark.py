@@ -0,0 +1,254 @@
+"""Benchmark the research hot path against a local mock suggest server.
+
+Fetching (google_autocomplete through expand_keywords), scoring, clustering
+and building a run's frame are timed separately, and nothing talks to
+Google: a MockSuggestServer is started in-process unless ``--url`` points at
+one started with ``python mock_suggest.py`` (which keeps the server's work
+off the benchmark's CPU).
+
+    python benchmark.py --seeds 20 --latency 0.05
+    python benchmark.py --seeds 50 --throttle-rate 0.05 -o benchmarks.jsonl
+    python benchmark.py --analysis "Quick Suggestions"
+
+Prints one JSON record, or appends it as a line to ``-o`` so runs can be
+compared over time. Each record also measures the app's cold start in a
+fresh interpreter; ``--startup-budget`` fails the run (exit status 1) if the
+first script run takes longer or uses more memory than budgeted.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from mock_suggest import MockSuggestServer, add_arguments, server_options
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "autocomplete.py")
+# Only loaded once there are results to draw (see autocomplete.py); Streamlit
+# itself imports the plotly base package for its chart theme
+DEFERRED_MODULES = ("plotly.express", "matplotlib.pyplot", "wordcloud")
+STARTUP_BUDGET = {"first_run_seconds": 1.5, "peak_rss_mb": 180.0}
+
+# Runs in a fresh interpreter: timing starts before Streamlit is imported
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+finished = time.perf_counter()
+from benchmark import DEFERRED_MODULES, peak_rss_mb
+print(json.dumps({
+    "streamlit_import_seconds": round(imported - started, 3),
+    "first_run_seconds": round(finished - imported, 3),
+    "peak_rss_mb": peak_rss_mb(),
+    "modules": len(sys.modules),
+    "deferred_loaded": [m for m in DEFERRED_MODULES if m in sys.modules],
+    "exception": bool(at.exception),
+}))
+"""
+
+SEED_WORDS = ["electric", "solar", "running", "coffee", "garden", "laptop", "travel", "yoga", "pet", "budget"]
+SEED_NOUNS = ["cars", "panels", "shoes", "beans", "tools", "bags", "insurance", "mats", "food", "apps"]
+
+
+def make_seeds(n: int) -> list[str]:
+    return [f"{SEED_WORDS[i % 10]} {SEED_NOUNS[i // 10 % 10]}" + (f" {i // 100}" if i >= 100 else "") for i in range(n)]
+
+def make_keywords(base: list[str], n: int) -> list[str]:
+    """``n`` unique keywords shaped like ``base``, numbered once it runs out"""
+    base = list(dict.fromkeys(base)) or ["keyword"]
+    return [base[i % len(base)] + (f" {i // len(base)}" if i >= len(base) else "") for i in range(n)]
+
+def percentiles(values) -> dict:
+    if not len(values):
+        return {}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50": round(p50, 4), "p90": round(p90, 4), "p99": round(p99, 4), "max": round(max(values), 4)}
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives fork/exec on Linux, so a child would report its parent's peak;
+    # VmHWM belongs to this process's own address space
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:  # not Linux
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_startup(app: str = APP) -> dict:
+    """Cold start of the app: first script run (welcome screen), peak RSS and what got imported"""
+    env = dict(os.environ, SUGGEST_CACHE=":memory:", JOBS_DB=":memory:")  # never resume real jobs
+    out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, app], capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(APP), check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def over_budget(startup: dict, budget: dict = STARTUP_BUDGET) -> list[str]:
+    return [f"{key} {startup[key]} > {limit}" for key, limit in budget.items() if startup[key] > limit]
+
+def bench_fetch(seeds: list[str], gl: str, concurrency: int, lookahead: int, server=None,
+                analysis: str = None) -> tuple[dict, list]:
+    from keyword_engine import DEFAULT_ANALYSIS, QueryPlanner, cache, expand_keywords
+
+    submitted = {}
+    latencies = []
+    results = []
+    failed = []
+
+    def feed():
+        for seed in seeds:
+            submitted[seed] = time.perf_counter()  # its plan goes into the pool now
+            yield seed
+
+    planner = QueryPlanner()
+    requests_before = server.requests if server else 0
+    started = time.perf_counter()
+    for seed, buckets in expand_keywords(feed(), gl, concurrency, lookahead,
+                                         on_error=lambda seed, exc: failed.append(seed), planner=planner,
+                                         analysis=analysis or DEFAULT_ANALYSIS):
+        latencies.append(time.perf_counter() - submitted[seed])
+        results.append((seed, buckets))
+    elapsed = time.perf_counter() - started
+
+    stats = {
+        "seconds": round(elapsed, 3),
+        "seeds": len(results),
+        "failed_seeds": len(failed),
+        "queries": planner.issued,
+        "queries_per_second": round(planner.issued / elapsed, 1),
+        "seed_latency": percentiles(latencies),
+        "cache": cache.stats.as_dict(),
+    }
+    if server:
+        stats["http_requests"] = server.requests - requests_before
+        stats["http_statuses"] = {str(code): n for code, n in sorted(server.statuses.items())}
+    return stats, results
+
+def bench_scoring(keywords: list[str]) -> dict:
+    from clustering import assign_clusters
+    from scoring import score_keywords
+
+    per_100k = 100_000 / len(keywords)
+    started = time.perf_counter()
+    score_keywords(keywords)
+    scoring = time.perf_counter() - started
+    started = time.perf_counter()
+    assign_clusters(keywords)
+    clustering = time.perf_counter() - started
+    return {"keywords": len(keywords),
+            "scoring_seconds_per_100k": round(scoring * per_100k, 3),
+            "clustering_seconds_per_100k": round(clustering * per_100k, 3)}
+
+def bench_frame(results: list, gl: str) -> dict:
+    from keyword_engine import BUCKETS
+    from results import ResearchRun
+
+    started = time.perf_counter()
+    run = ResearchRun([seed for seed, _ in results], gl, BUCKETS)
+    for seed, buckets in results:
+        run.add_buckets(seed, buckets)
+    run.finish()
+    seconds = time.perf_counter() - started
+    return {"rows": len(run), "seconds": round(seconds, 3), "cross_seed_clusters": cross_seed_clusters(run.frame)}
+
+def cross_seed_clusters(frame) -> int:
+    """Rows whose cluster's canonical keyword was not found for the row's seed (must be 0)"""
+    found = pd.MultiIndex.from_arrays([frame["Seed"].astype(str), frame["Keyword"].astype(str)])
+    canonical = pd.MultiIndex.from_arrays([frame["Seed"].astype(str), frame["Cluster_Keyword"].astype(str)])
+    return int((~canonical.isin(found)).sum())
+
+
+def run_benchmark(args) -> dict:
+    server = None
+    url = args.url
+    if url is None:
+        server = MockSuggestServer(**server_options(args))
+        url = server.start()
+    # Point the engine at the mock before it is imported: it reads these once
+    os.environ["SUGGEST_URL"] = url
+    os.environ["SUGGEST_CACHE"] = ":memory:"
+    os.environ["SUGGEST_RATE"] = str(args.rate)
+    os.environ["SUGGEST_BURST"] = os.environ["SUGGEST_GLOBAL_BURST"] = str(max(1, int(args.rate)))
+    os.environ["SUGGEST_GLOBAL_RATE"] = str(args.rate)
+    try:
+        fetch, results = bench_fetch(make_seeds(args.seeds), args.gl, args.concurrency, args.lookahead, server,
+                                     args.analysis)
+    finally:
+        if server:
+            server.stop()
+    fetched = [s for _, buckets in results for suggestions in buckets.values() for s in suggestions]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"seeds": args.seeds, "gl": args.gl, "analysis": args.analysis, "concurrency": args.concurrency,
+                   "lookahead": args.lookahead, "rate": args.rate, "url": args.url or "in-process", **(server_options(args) if server else {})},
+        "fetch": fetch,
+        "scoring": bench_scoring(make_keywords(fetched, args.keywords)),
+        "frame": bench_frame(results, args.gl),
+        "peak_rss_mb": peak_rss_mb(),
+        "startup": bench_startup(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetching, scoring and frame building against a mock server")
+    parser.add_argument("--seeds", type=int, default=20, help="number of generated seeds (default: 20)")
+    parser.add_argument("--gl", default="US")
+    parser.add_argument("--analysis", default="Complete Analysis", help="analysis type, i.e. which query plan to run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--lookahead", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1000.0, help="client rate limit in requests/s (default: 1000)")
+    parser.add_argument("--keywords", type=int, default=100_000, help="keywords to score and cluster (default: 100000)")
+    parser.add_argument("--url", help="suggest URL of an already running mock server")
+    parser.add_argument("-o", "--output", default="-", help="JSON lines file to append to, '-' for stdout")
+    parser.add_argument("--startup-budget", action="store_true",
+                        help=f"exit with status 1 if the app's cold start exceeds {STARTUP_BUDGET}")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    record = run_benchmark(args)
+    if args.output == "-":
+        print(json.dumps(record, indent=2))
+    else:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    fetch = record["fetch"]
+    print(f"{fetch['queries_per_second']} queries/s, seed p50 (s) {fetch['seed_latency'].get('p50', 'n/a')}, "
+          f"scoring {record['scoring']['scoring_seconds_per_100k']}s/100k, peak RSS {record['peak_rss_mb']} MB, "
+          f"app cold start {record['startup']['first_run_seconds']}s / {record['startup']['peak_rss_mb']} MB",
+          file=sys.stderr)
+    if record["frame"]["cross_seed_clusters"]:
+        print(f"{record['frame']['cross_seed_clusters']} rows clustered with another seed's keyword", file=sys.stderr)
+        return 1
+    if args.startup_budget:
+        exceeded = over_budget(record["startup"])
+        if exceeded:
+            print("startup over budget: " + ", ".join(exceeded), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Near-duplicate keyword clustering.
+
+Keywords are compared as sets of normalized tokens: lower case, punctuation
+removed, a naive plural strip ("cars" -> "car"), minus stop words and the
+words of the keyword's own seed, which nearly every one of its suggestions
+contains. Keywords are only compared with keywords of the same seed: with
+their seed words gone, "best coffee beans" and "best yoga mats" would
+otherwise look identical. Candidate pairs come from MinHash signatures split
+into LSH bands, where each keyword is paired only with the preferred member
+of every band bucket (per seed) it falls in, so the work stays linear in the
+number of keywords.
+Candidates are kept when their exact token Jaccard similarity reaches
+``threshold``. Clusters are then formed around centers, taken in preference
+order, so each cluster is a canonical keyword plus its near-duplicates rather
+than a chain of loosely related ones.
+"""
+import numpy as np
+import pandas as pd
+
+NUM_BANDS = 10
+ROWS_PER_BAND = 2
+THRESHOLD = 0.5
+STOP_WORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "vs"}
+
+_PRIME = (1 << 31) - 1
+_PAIR_CHUNK = 1 << 18
+
+
+def _tokens(texts: pd.Series) -> pd.Series:
+    """One normalized token per row, indexed by the position of its text"""
+    words = texts.str.lower().str.replace(r"[^\w\s]", " ", regex=True).str.split().explode().dropna()
+    return words.str.replace(r"(?<=\w\w[^s])s$", "", regex=True)
+
+def _token_sets(keywords: pd.Series, groups: np.ndarray, seeds: pd.Index) -> tuple[np.ndarray, np.ndarray, int]:
+    """(row, token id) pairs sorted by row, without duplicates; plus the vocabulary size"""
+    tokens = _tokens(keywords)
+    rows = tokens.index.to_numpy()
+    keep = ~tokens.isin(STOP_WORDS).to_numpy()
+    seed_tokens = _tokens(pd.Series(seeds, dtype=object))
+    own = pd.MultiIndex.from_arrays([seed_tokens.index.to_numpy(), seed_tokens.to_numpy()])
+    keep &= ~pd.MultiIndex.from_arrays([groups[rows], tokens.to_numpy()]).isin(own)
+    # A keyword made only of dropped words is still compared on its full token set
+    has_kept = np.bincount(rows[keep], minlength=len(keywords)) > 0
+    keep |= ~has_kept[rows]
+    codes, vocab = pd.factorize(tokens[keep])
+    pairs = np.unique(rows[keep].astype(np.int64) * len(vocab) + codes)
+    return pairs // len(vocab), pairs % len(vocab), len(vocab)
+
+def _candidates(rows, codes, vocab_size: int, n: int, rank: np.ndarray, groups: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(preferred, other) keyword pairs of the same group sharing at least one LSH band bucket"""
+    rng = np.random.default_rng(0)
+    coefficients = rng.integers(1, _PRIME, size=(2, NUM_BANDS * ROWS_PER_BAND), dtype=np.int64)
+    present, starts = np.unique(rows, return_index=True)
+    token_ids = np.arange(vocab_size, dtype=np.int64)[:, None]
+    left, right = [], []
+    for band in range(NUM_BANDS):
+        cols = slice(band * ROWS_PER_BAND, (band + 1) * ROWS_PER_BAND)
+        hashes = (token_ids * coefficients[0, cols] + coefficients[1, cols]) % _PRIME
+        signature = np.minimum.reduceat(hashes[codes], starts, axis=0)
+        key = signature[:, 0] * _PRIME + signature[:, 1]
+        order = np.lexsort((rank[present], key, groups[present]))
+        key, group = key[order], groups[present][order]
+        first = np.flatnonzero(np.r_[True, (key[1:] != key[:-1]) | (group[1:] != group[:-1])])
+        leader = present[order[np.repeat(first, np.diff(np.r_[first, len(key)]))]]
+        member = present[order]
+        differs = leader != member
+        left.append(leader[differs])
+        right.append(member[differs])
+    pairs = np.unique(np.concatenate(left) * n + np.concatenate(right))
+    return pairs // n, pairs % n
+
+def _jaccard(rows, codes, n: int, left, right) -> np.ndarray:
+    counts = np.bincount(rows, minlength=n)
+    width = max(int(counts.max()), 1)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    padded = np.full((n, width), -1, dtype=np.int64)
+    padded[rows, np.arange(len(rows)) - starts[rows]] = codes
+    similarity = np.empty(len(left))
+    step = max(1, _PAIR_CHUNK // (width * width))
+    for lo in range(0, len(left), step):
+        a, b = padded[left[lo:lo + step]], padded[right[lo:lo + step]]
+        shared = ((a[:, :, None] == b[:, None, :]) & (a[:, :, None] >= 0)).sum(axis=(1, 2))
+        union = counts[left[lo:lo + step]] + counts[right[lo:lo + step]] - shared
+        similarity[lo:lo + step] = shared / union
+    return similarity
+
+def _centers(n: int, order: np.ndarray, left, right) -> np.ndarray:
+    """Greedy star clustering: in preference order, each keyword not yet taken
+    becomes a center and takes its untaken similar keywords, so every member
+    is similar to its center and clusters never chain"""
+    center = np.arange(n)
+    if not len(left):
+        return center
+    heads = np.concatenate([left, right])
+    tails = np.concatenate([right, left])
+    by_head = np.argsort(heads, kind="stable")
+    indptr = np.searchsorted(heads[by_head], np.arange(n + 1)).tolist()
+    neighbours = tails[by_head].tolist()
+    taken = bytearray(n)
+    linked = order[np.isin(order, heads)].tolist()
+    for node in linked:
+        if taken[node]:
+            continue
+        taken[node] = 1
+        for other in neighbours[indptr[node]:indptr[node + 1]]:
+            if not taken[other]:
+                taken[other] = 1
+                center[other] = node
+    return center
+
+def assign_clusters(keywords, seeds=None, weights=None, threshold: float = THRESHOLD) -> tuple[np.ndarray, np.ndarray]:
+    """Cluster ``keywords``; returns (cluster id, canonical position) per keyword.
+
+    ``seeds`` is the seed each keyword was found for (unique per seed and
+    keyword); a cluster never spans two seeds. Cluster ids are numbered from
+    the largest cluster down. The canonical
+    keyword is the one with the highest weight (e.g. how often it was
+    suggested), then the shortest, then alphabetically first.
+    """
+    keywords = pd.Series(keywords, dtype=object).reset_index(drop=True)
+    n = len(keywords)
+    if not n:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+    weights = np.zeros(n) if weights is None else np.asarray(weights, dtype=float)
+    preference = pd.DataFrame({"weight": -weights, "length": keywords.str.len().to_numpy(), "keyword": keywords})
+    order = preference.sort_values(["weight", "length", "keyword"], kind="stable").index.to_numpy()
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+
+    groups, seed_labels = pd.factorize(pd.Series([""] * n if seeds is None else seeds, dtype=object))
+    rows, codes, vocab_size = _token_sets(keywords, groups, seed_labels)
+    if len(rows):
+        left, right = _candidates(rows, codes, vocab_size, n, rank, groups)
+        similar = _jaccard(rows, codes, n, left, right) >= threshold
+        center = _centers(n, order, left[similar], right[similar])
+    else:
+        center = np.arange(n)
+
+    centers = np.unique(center)
+    sizes = np.bincount(center, minlength=n)
+    by_size = centers[np.lexsort((rank[centers], -sizes[centers]))]
+    cluster_of_center = np.empty(n, dtype=np.int32)
+    cluster_of_center[by_size] = np.arange(len(by_size), dtype=np.int32)
+    return cluster_of_center[center], center
@@ -0,0 +1,159 @@
+"""Every keyword ever found, searchable across runs.
+
+Finished runs are added to a local corpus (``CORPUS_DB``): one row per
+distinct keyword with when it was first and last seen, and one row per
+(keyword, seed, category, market) sighting. Keywords are indexed with SQLite
+FTS5 and matches are read newest first straight from the index, stopping at
+the limit instead of ranking every hit, so searches stay fast as the corpus
+grows. FTS5 only reads lazily like that for whole terms and for prefixes its
+prefix indexes cover (up to 3 characters); a longer prefix would merge the
+full list of every matching term first, so it is expanded into its terms
+(kept in ``terms``) instead. Queries are split into terms by the index's own
+tokenizer, so both always agree.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+CORPUS_DB = os.environ.get("CORPUS_DB", ".cache/corpus.sqlite3")
+SEARCH_LIMIT = 200
+MAX_COMPLETIONS = 128  # terms a long prefix is expanded into; past that, FTS5 merges them itself
+# Combining marks are part of words, or Devanagari vowel signs would split them
+TOKENIZER = "unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+
+
+class KeywordCorpus:
+    def __init__(self, path: str = CORPUS_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS keywords (
+                    id INTEGER PRIMARY KEY,
+                    keyword TEXT NOT NULL UNIQUE,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sightings (
+                    keyword_id INTEGER NOT NULL,
+                    seed TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    gl TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (keyword_id, seed, category, gl)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY) WITHOUT ROWID;
+                CREATE VIRTUAL TABLE IF NOT EXISTS keywords_fts USING fts5(
+                    keyword, content='keywords', content_rowid='id', prefix='1 2 3', tokenize="{TOKENIZER}"
+                );
+                -- Only new keywords are indexed: an upsert that updates does not fire this
+                CREATE TRIGGER IF NOT EXISTS keywords_fts_insert AFTER INSERT ON keywords BEGIN
+                    INSERT INTO keywords_fts (rowid, keyword) VALUES (new.id, new.keyword);
+                END;
+                CREATE TEMP TABLE IF NOT EXISTS staged (keyword TEXT, seed TEXT, category TEXT);
+                -- Scratch index to split text into terms exactly like keywords_fts does
+                CREATE VIRTUAL TABLE IF NOT EXISTS temp.tokens USING fts5(text, content='', tokenize="{TOKENIZER}");
+                CREATE VIRTUAL TABLE IF NOT EXISTS temp.token_terms USING fts5vocab(temp, tokens, instance);
+            """.replace("{TOKENIZER}", TOKENIZER))
+
+    def add_rows(self, rows, gl: str, seen: float = None) -> int:
+        """Add (keyword, seed, category) rows found in market ``gl``; returns the number of rows"""
+        seen = seen or time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT INTO staged VALUES (?, ?, ?)", rows)
+                staged = conn.execute("SELECT count(*) FROM staged").fetchone()[0]
+                last_id = conn.execute("SELECT coalesce(max(id), 0) FROM keywords").fetchone()[0]
+                conn.execute("""
+                    INSERT INTO keywords (keyword, first_seen, last_seen)
+                    SELECT DISTINCT keyword, :seen, :seen FROM staged WHERE true
+                    ON CONFLICT (keyword) DO UPDATE SET last_seen = excluded.last_seen
+                """, {"seen": seen})
+                conn.execute("""
+                    INSERT INTO sightings (keyword_id, seed, category, gl, first_seen, last_seen)
+                    SELECT DISTINCT k.id, s.seed, s.category, :gl, :seen, :seen
+                    FROM staged s JOIN keywords k ON k.keyword = s.keyword WHERE true
+                    ON CONFLICT DO UPDATE SET last_seen = excluded.last_seen
+                """, {"gl": gl, "seen": seen})
+                conn.execute("INSERT INTO tokens (rowid, text) SELECT id, keyword FROM keywords WHERE id > ?", (last_id,))
+                conn.execute("INSERT OR IGNORE INTO terms SELECT DISTINCT term FROM token_terms")
+                conn.execute("INSERT INTO tokens (tokens) VALUES ('delete-all')")
+                conn.execute("DELETE FROM staged")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return staged
+
+    def add_run(self, run) -> int:
+        """Add a finished ResearchRun's rows"""
+        rows = run.frame[["Keyword", "Seed", "Category"]].drop_duplicates()
+        return self.add_rows(rows.astype(str).itertuples(index=False, name=None), run.gl)
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT, prefix: bool = True) -> pd.DataFrame:
+        """Keywords containing every word of ``text``, most recently discovered first"""
+        columns = ["Keyword", "Seeds", "Categories", "Markets", "First_Seen", "Last_Seen"]
+        with self._lock:
+            query = self._match(text, prefix)
+            if query is None:
+                return pd.DataFrame(columns=columns)
+            rows = self._conn.execute("""
+                WITH hits AS (
+                    SELECT rowid AS id FROM keywords_fts WHERE keywords_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+                )
+                SELECT k.keyword, group_concat(DISTINCT s.seed), group_concat(DISTINCT s.category),
+                       group_concat(DISTINCT s.gl), k.first_seen, k.last_seen
+                FROM hits JOIN keywords k ON k.id = hits.id JOIN sightings s ON s.keyword_id = k.id
+                GROUP BY k.id ORDER BY k.id DESC
+            """, (query, limit)).fetchall()
+        frame = pd.DataFrame(rows, columns=columns)
+        for column in ("First_Seen", "Last_Seen"):
+            frame[column] = pd.to_datetime(frame[column], unit="s")
+        return frame
+
+    def _match(self, text: str, prefix: bool) -> str:
+        """FTS5 query for keywords with every term of ``text``; the last one as a prefix (search as you type)"""
+        conn = self._conn
+        conn.execute("INSERT INTO tokens (text) VALUES (?)", (text,))
+        tokens = [term for term, in conn.execute("SELECT term FROM token_terms ORDER BY offset")]
+        conn.execute("INSERT INTO tokens (tokens) VALUES ('delete-all')")
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]  # tokens never hold quotes: they are punctuation
+        if prefix:
+            last = tokens[-1]
+            completions = [term for term, in conn.execute(
+                "SELECT term FROM terms WHERE term >= ? AND term < ? LIMIT ?",
+                (last, last + "\U0010ffff", MAX_COMPLETIONS + 1))]
+            if len(last) <= 3 or len(completions) > MAX_COMPLETIONS:
+                terms[-1] += "*"  # served by a prefix index, or too many terms to list
+            elif completions:
+                terms[-1] = "(" + " OR ".join(f'"{term}"' for term in completions) + ")"
+        return " AND ".join(terms)
+
+    def __len__(self):
+        # Keywords are never deleted, so the largest id is the count without a full scan
+        with self._lock:
+            return self._conn.execute("SELECT coalesce(max(id), 0) FROM keywords").fetchone()[0]
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+def get_corpus() -> KeywordCorpus:
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = KeywordCorpus()
+        return _corpus
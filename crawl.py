@@ -0,0 +1,98 @@
+"""Multi-level keyword expansion.
+
+Level 0 is the seed's normal query plan (see keyword_engine.build_query_plan).
+Every new suggestion then becomes a query of its own one level deeper, up to
+``max_depth`` and never past ``query_budget`` fetches. Queries and suggestions
+are deduplicated on a normalized form across the whole crawl, and the
+frontier is ordered so children of the most productive queries go first.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from keyword_engine import (ANALYSIS_PLANS, DEFAULT_ANALYSIS, DEFAULT_CONCURRENCY, QueryPlanner, build_query_plan,
+                            merge_buckets, normalize_query, resolve_plan)
+from metrics import metrics
+
+LONG_TAIL = "Long Tail"
+STRATEGIES = ("priority", "bfs")
+
+
+class CrawlStats:
+    def __init__(self):
+        self.queries = 0
+        self.keywords = 0
+
+    def record(self, new_keywords: int):
+        self.queries += 1
+        self.keywords += new_keywords
+
+
+def crawl_keyword(seed: str, gl: str, max_depth: int = 2, query_budget: int = 500,
+                  concurrency: int = DEFAULT_CONCURRENCY, strategy: str = "priority", max_age: float = None,
+                  analysis: str = DEFAULT_ANALYSIS):
+    """Expand ``seed`` recursively; returns (buckets, CrawlStats).
+
+    Level-0 results land in the usual buckets; deeper suggestions go to a
+    "Long Tail" bucket in discovery order. ``strategy="bfs"`` expands level by
+    level, ``"priority"`` expands children of the highest-yield queries first.
+    ``max_age`` is handed to the QueryPlanner for refreshes; ``analysis``
+    picks the level-0 plan.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {STRATEGIES}")
+
+    stats = CrawlStats()
+    planner = QueryPlanner(max_age=max_age)
+    plan = build_query_plan(seed, analysis)[:query_budget]
+    seen_queries = {normalize_query(q) for _, q in plan}
+    seen_keywords = {normalize_query(seed)}
+    long_tail = []
+    frontier = []
+    order = count()
+
+    def push_children(suggestions, depth, parent_yield):
+        if depth > max_depth:
+            return
+        for s in suggestions:
+            key = normalize_query(s)
+            if key in seen_queries:
+                continue
+            seen_queries.add(key)
+            priority = depth if strategy == "bfs" else -parent_yield
+            heapq.heappush(frontier, (priority, next(order), depth, s))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = planner.fetch_all([q for _, q in plan], gl, pool)
+        followup_budget = min(ANALYSIS_PLANS[analysis][1], max(0, query_budget - len(seen_queries)))
+        plan, results = resolve_plan(plan, futures, planner, gl, pool, followup_budget)
+        seen_queries.update(normalize_query(q) for _, q in plan)
+        metrics.record_plan(seed, plan)
+        buckets = merge_buckets(plan, results)
+        counted = set()
+        for (_, query), suggestions in zip(plan, results):
+            if normalize_query(query) in counted:
+                continue  # shared with another bucket, fetched once
+            counted.add(normalize_query(query))
+            new = [s for s in suggestions if normalize_query(s) not in seen_keywords]
+            seen_keywords.update(normalize_query(s) for s in new)
+            stats.record(len(new))
+            push_children(new, 1, len(new))
+
+        while frontier and stats.queries < query_budget:
+            batch = [heapq.heappop(frontier) for _ in range(min(concurrency, len(frontier), query_budget - stats.queries))]
+            futures = planner.fetch_all([query for *_, query in batch], gl, pool)
+            metrics.record_plan(seed, [(LONG_TAIL, query) for *_, query in batch])
+            for (_, _, depth, _), future in zip(batch, futures):
+                new = []
+                for s in future.result():
+                    key = normalize_query(s)
+                    if key not in seen_keywords:
+                        seen_keywords.add(key)
+                        new.append(s)
+                long_tail.extend(new)
+                stats.record(len(new))
+                push_children(new, depth + 1, len(new))
+
+    buckets[LONG_TAIL] = long_tail
+    return buckets, stats
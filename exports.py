@@ -0,0 +1,120 @@
+"""On-demand result exports.
+
+Files are written in row chunks (so memory stays flat however large the run
+is) into an export directory, named by run id, format and a hash of the
+exported content; asking for the same export again reuses the file.
+"""
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+
+import pandas as pd
+
+from metrics import metrics
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", ".cache/exports")
+MAX_FILES = int(os.environ.get("EXPORT_MAX_FILES", "20"))
+CHUNK_ROWS = 50_000
+
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "CSV (zstd)": (".csv.zst", "application/zstd"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "JSON Lines": (".jsonl", "application/jsonl"),
+}
+
+
+def content_hash(frame: pd.DataFrame) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(",".join(map(str, frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _chunks(frame: pd.DataFrame):
+    """Row chunks; an empty frame is one empty chunk, so the header or schema is still written"""
+    for start in range(0, max(len(frame), 1), CHUNK_ROWS):
+        yield start, frame.iloc[start:start + CHUNK_ROWS]
+
+def _write_csv(frame: pd.DataFrame, f):
+    for start, chunk in _chunks(frame):
+        chunk.to_csv(f, header=start == 0, index=False)
+
+def _write_jsonl(frame: pd.DataFrame, f):
+    for _, chunk in _chunks(frame):
+        if chunk.empty:
+            continue
+        f.write(chunk.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n")
+
+def _write_parquet(frame: pd.DataFrame, path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for _, chunk in _chunks(frame):
+            # Each row group stores the dictionary of every categorical column: only the values it uses
+            if len(chunk):  # an empty frame keeps its categories, which carry the value types
+                chunk = chunk.apply(lambda column: column.cat.remove_unused_categories()
+                                    if isinstance(column.dtype, pd.CategoricalDtype) else column)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # Pruned dictionaries may need narrower indices; keep one schema across chunks
+                schema = pa.schema([pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                                    if pa.types.is_dictionary(field.type) else field for field in table.schema],
+                                   metadata=table.schema.metadata)
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_export(frame: pd.DataFrame, fmt: str, path: str):
+    if fmt == "Parquet":
+        _write_parquet(frame, path)
+    elif fmt == "CSV (gzip)":
+        with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as f:
+            _write_csv(frame, f)
+    elif fmt == "CSV (zstd)":
+        import pyarrow as pa
+
+        with pa.CompressedOutputStream(path, "zstd") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+            _write_csv(frame, f)
+    elif fmt == "JSON Lines":
+        with open(path, "w", encoding="utf-8") as f:
+            _write_jsonl(frame, f)
+    elif fmt == "CSV":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            _write_csv(frame, f)
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+
+def export_file(frame: pd.DataFrame, fmt: str, run_id: str, name: str = "export") -> str:
+    """Path of the export, writing it only if this content was not exported before"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{name}-{run_id}-{content_hash(frame)}{FORMATS[fmt][0]}")
+    if not os.path.exists(path):
+        # One temp file per writer: two sessions may export the same run at once
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=EXPORT_DIR)
+        os.close(fd)
+        try:
+            with metrics.stage("export"):
+                write_export(frame, fmt, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        _prune()
+    return path
+
+def export_bytes(frame: pd.DataFrame, fmt: str, run_id: str, name: str = "export") -> bytes:
+    with open(export_file(frame, fmt, run_id, name), "rb") as f:
+        return f.read()
+
+def _prune():
+    files = sorted((os.path.join(EXPORT_DIR, f) for f in os.listdir(EXPORT_DIR) if not f.endswith(".tmp")),
+                   key=os.path.getmtime)
+    for path in files[:-MAX_FILES]:
+        os.remove(path)
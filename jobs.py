@@ -0,0 +1,414 @@
+"""Background research jobs with resumable checkpoints.
+
+"Generate Research" submits a job and gets its id back at once. A small pool
+of worker threads (``JOB_WORKERS``) runs jobs outside the Streamlit script,
+so reloading the page, closing the tab or many users starting runs never
+blocks the web process or loses work; the page just polls the job. Each
+seed's merged buckets are checkpointed to SQLite (``JOBS_DB``) the moment
+the seed completes. A job that stopped early (cancelled, throttled, or
+running when the process died) resumes from its checkpoints, and the queries
+its unfinished seeds had already completed come back from the suggestion
+cache instead of being sent again, however long ago they were fetched (as
+long as the cache still retains them). Every job is owned by the process
+running it, which keeps a heartbeat in the same file; several processes can
+share ``JOBS_DB``, and a job is only picked up by another one after its
+owner stops beating. A job that completes is saved as today's
+snapshot of its seeds in each market and compared with the previous one
+(see ``snapshots``); ``max_age`` in the spec makes it a refresh. Whatever a
+job found is added to the keyword corpus (see ``corpus``).
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from corpus import get_corpus
+from crawl import LONG_TAIL, crawl_keyword
+from keyword_engine import (BUCKETS, DEFAULT_ANALYSIS, QueryPlanner, SuggestError, bucket_rows, cache,
+                            expand_markets)
+from markets import MarketRun
+from metrics import metrics
+from results import ResearchRun
+from snapshots import bucket_ranks, get_store as get_snapshots
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.environ.get("JOBS_DB", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+MAX_JOBS = 50
+MAX_JOBS_IN_MEMORY = 10  # finished jobs beyond this are rebuilt from their checkpoints when asked for
+HEARTBEAT_SECONDS = 10
+OWNER_TIMEOUT = 3 * HEARTBEAT_SECONDS  # an owner silent for this long is gone; its jobs get picked up
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One research run and its progress; ``spec`` is what the sidebar asked for"""
+
+    def __init__(self, spec: dict, job_id: str = None, status: str = QUEUED, created: float = None,
+                 error: str = None, taken: str = None, owner: str = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.status = status
+        self.created = created or time.time()
+        self.error = error
+        self.taken = taken  # date of the snapshots a completed job saved
+        self.owner = owner  # the JobQueue (process) running it
+        self.seeds_done = 0
+        self.current = None
+        self.partial = []
+        self.lock = threading.Lock()
+        self._cancel = threading.Event()
+        self.run = self._new_run()
+
+    def _new_run(self):
+        seeds, gls = self.spec["seeds"], self.spec["gls"]
+        if len(gls) > 1:
+            run = MarketRun(seeds, gls, BUCKETS)
+        else:
+            run = ResearchRun(seeds, gls[0], BUCKETS + ([LONG_TAIL] if self.spec.get("crawl_depth") else []))
+        run.run_id = self.id
+        return run
+
+    @property
+    def total(self) -> int:
+        return len(self.spec["seeds"]) * len(self.spec["gls"])
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def add(self, seed: str, gl: str, buckets: dict[str, list[str]]):
+        with self.lock:
+            if isinstance(self.run, MarketRun):
+                self.run.add_buckets(seed, gl, buckets, self.spec["max_suggestions"])
+            else:
+                self.run.add_buckets(seed, buckets, self.spec["max_suggestions"])
+            self.seeds_done += 1
+            self.partial = []
+
+    def preview(self):
+        """Rows so far, including the seed being fetched, safe to call while the worker appends"""
+        with self.lock:
+            if self.run.complete:
+                runs = self.run.runs.values() if isinstance(self.run, MarketRun) else [self.run]
+                return pd.concat([run.frame for run in runs], ignore_index=True)
+            return self.run.preview(self.partial)
+
+    def market_runs(self):
+        """(gl, ResearchRun) of every market"""
+        if isinstance(self.run, MarketRun):
+            return self.run.runs.items()
+        return [(self.run.gl, self.run)]
+
+    def cancel(self):
+        self._cancel.set()
+
+
+class JobStore:
+    """Job specs, statuses and per-seed checkpoints in one SQLite file"""
+
+    def __init__(self, path: str = JOBS_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    spec TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    taken TEXT,
+                    owner TEXT
+                )
+            """)
+            columns = {column for _, column, *_ in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("taken", "owner"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, beat REAL NOT NULL)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    job_id TEXT NOT NULL,
+                    seed TEXT NOT NULL,
+                    gl TEXT NOT NULL,
+                    buckets TEXT NOT NULL,
+                    completed REAL NOT NULL,
+                    PRIMARY KEY (job_id, seed, gl)
+                )
+            """)
+
+    def save(self, job: Job):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO jobs (id, spec, status, error, created, updated, taken, owner) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (job.id, json.dumps(job.spec), job.status, job.error, job.created, time.time(),
+                                job.taken, job.owner))
+
+    def checkpoint(self, job_id: str, seed: str, gl: str, buckets: dict[str, list[str]]):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                               (job_id, seed, gl, json.dumps(buckets), time.time()))
+
+    def checkpoints(self, job_id: str) -> list[tuple[str, str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seed, gl, buckets FROM checkpoints WHERE job_id = ? ORDER BY completed", (job_id,)
+            ).fetchall()
+        return [(seed, gl, json.loads(buckets)) for seed, gl, buckets in rows]
+
+    def load(self, job_id: str) -> Job:
+        with self._lock:
+            row = self._conn.execute("SELECT spec, status, created, error, taken, owner FROM jobs WHERE id = ?",
+                                     (job_id,)).fetchone()
+        if row is None:
+            return None
+        spec, status, created, error, taken, owner = row
+        return Job(json.loads(spec), job_id, status, created, error, taken, owner)
+
+    def beat(self, owner: str):
+        """Mark ``owner`` alive"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO owners VALUES (?, ?)", (owner, now))
+            self._conn.execute("DELETE FROM owners WHERE beat < ?", (now - 100 * OWNER_TIMEOUT,))
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Queue the job for ``owner``, unless a live owner still runs it; atomic across processes"""
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET owner = ?, status = ?, error = NULL, updated = ? WHERE id = ? AND "
+                "(status NOT IN (?, ?) OR owner IS NULL OR owner = ? OR "
+                "owner NOT IN (SELECT owner FROM owners WHERE beat >= ?))",
+                (owner, QUEUED, time.time(), job_id, QUEUED, RUNNING, owner, time.time() - OWNER_TIMEOUT))
+        return claimed.rowcount == 1
+
+    def orphaned(self) -> list[str]:
+        """Unfinished jobs whose owner is gone"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND "
+                "(owner IS NULL OR owner NOT IN (SELECT owner FROM owners WHERE beat >= ?)) ORDER BY created",
+                (QUEUED, RUNNING, time.time() - OWNER_TIMEOUT)).fetchall()
+        return [job_id for job_id, in rows]
+
+    def prune(self, keep: int = MAX_JOBS):
+        """Forget the oldest finished jobs beyond ``keep``"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND id NOT IN "
+                "(SELECT id FROM jobs ORDER BY created DESC LIMIT ?)", (QUEUED, RUNNING, keep))
+            self._conn.execute("DELETE FROM checkpoints WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="research-job")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.store.beat(self.owner)
+        threading.Thread(target=self._heartbeat, name="research-job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.store.beat(self.owner)
+                self.resume_interrupted()
+            except sqlite3.Error as e:
+                logger.warning("job heartbeat failed: %s", e)
+
+    def submit(self, spec: dict) -> Job:
+        job = Job(spec, owner=self.owner)
+        with self._lock:
+            self.jobs[job.id] = job
+            finished = sorted((j for j in self.jobs.values() if j.finished), key=lambda j: j.created)
+            for old in finished[:-MAX_JOBS_IN_MEMORY]:
+                del self.jobs[old.id]
+        self.store.save(job)
+        self._pool.submit(self._execute, job)
+        self.store.prune()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """A job of this process, or one rebuilt from its checkpoints.
+
+        Never starts work: a job still running elsewhere (or waiting to be
+        picked up after its owner died) comes back as a read-only snapshot
+        of its checkpoints so far.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        for seed, gl, buckets in self.store.checkpoints(job_id):
+            job.add(seed, gl, buckets)
+        if not job.finished:
+            return job
+        try:
+            job.run.finish()
+        except Exception as e:  # shown as a failed job rather than breaking the page
+            job.status, job.error = FAILED, f"{type(e).__name__}: {e}"
+        if job.status == DONE:
+            taken = job.taken or date.fromtimestamp(job.created).isoformat()
+            for gl, run in job.market_runs():
+                run.changes = get_snapshots().changes(job.spec["seeds"], gl, taken,
+                                                      job.spec.get("analysis", DEFAULT_ANALYSIS))
+        with self._lock:
+            return self.jobs.setdefault(job_id, job)
+
+    def resume(self, job_id: str) -> Job:
+        """Start a stopped job again; seeds already checkpointed are not re-fetched.
+
+        None if there is no such job or another live process is running it.
+        """
+        with self._lock:
+            current = self.jobs.get(job_id)
+            if current is not None and not current.finished:
+                return current
+        if not self.store.claim(job_id, self.owner):
+            return None
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            self.jobs[job_id] = job
+        self.store.save(job)
+        self._pool.submit(self._execute, job)
+        return job
+
+    def resume_interrupted(self):
+        """Pick up jobs whose process stopped while they were queued or running"""
+        for job_id in self.store.orphaned():
+            self.resume(job_id)
+
+    def _execute(self, job: Job):
+        spec = job.spec
+        restored = self.store.checkpoints(job.id)
+        for seed, gl, buckets in restored:
+            job.add(seed, gl, buckets)
+        done = {(seed, gl) for seed, gl, _ in restored}
+        job.status = RUNNING
+        self.store.save(job)
+
+        def show_partial(seed, gl, buckets):
+            if job._cancel.is_set():
+                raise JobCancelled()
+            with job.lock:
+                job.current = seed if len(spec["gls"]) == 1 else f"{seed} ({gl})"
+                job.partial = bucket_rows(seed, buckets, spec["max_suggestions"])
+
+        max_age = spec.get("max_age")
+        age = time.time() - job.created
+        if age > cache.ttl:
+            # Resumed after the cache TTL: whatever this job already fetched is still good to reuse
+            max_age = max(max_age or 0, age)
+        planner = QueryPlanner(max_age=max_age)
+        results = self._results(job, done, planner, show_partial)
+        status, error = DONE, None
+        try:
+            with metrics.stage("fetch"):
+                for seed, gl, buckets in results:
+                    self.store.checkpoint(job.id, seed, gl, buckets)
+                    job.add(seed, gl, buckets)
+                    if job._cancel.is_set():
+                        raise JobCancelled()
+            self._snapshot(job)
+        except JobCancelled:
+            status = CANCELLED
+        except SuggestError as e:
+            status, error = FAILED, str(e)
+        except Exception as e:  # a worker must never die silently: surface it on the job
+            status, error = FAILED, f"{type(e).__name__}: {e}"
+        finally:
+            results.close()
+            with job.lock:
+                job.current, job.partial = None, []
+                try:
+                    job.run.finish(planner.as_dict())
+                except Exception as e:  # scoring or clustering broke: fail the job rather than leave it running
+                    status, error = FAILED, f"{type(e).__name__}: {e}"
+            # Only now is the run safe to render
+            job.status, job.error = status, error
+            self.store.save(job)
+            if job.run.complete:
+                self._index(job)
+
+    def _index(self, job: Job):
+        """Add every keyword the job found, even if it stopped early, to the keyword corpus"""
+        try:
+            corpus = get_corpus()
+            for _, run in job.market_runs():
+                if len(run.frame):
+                    corpus.add_run(run)
+        except sqlite3.Error as e:  # the results are saved either way; only search misses them
+            logger.warning("job %s: keyword corpus not updated: %s", job.id, e)
+
+    def _snapshot(self, job: Job):
+        """Save a completed job as today's snapshot of each market, then compare with the previous one"""
+        spec = job.spec
+        rows = {gl: [] for gl in spec["gls"]}
+        for seed, gl, buckets in self.store.checkpoints(job.id):
+            rows[gl].extend(bucket_ranks(seed, buckets, spec["max_suggestions"]))
+        analysis = spec.get("analysis", DEFAULT_ANALYSIS)
+        snapshots = get_snapshots()
+        job.taken = date.today().isoformat()
+        for gl, run in job.market_runs():
+            snapshots.save(spec["seeds"], gl, rows[gl], job.taken, analysis)
+            run.changes = snapshots.changes(spec["seeds"], gl, job.taken, analysis)
+
+    def _results(self, job: Job, done: set, planner: QueryPlanner, on_partial):
+        spec = job.spec
+        seeds, gls = spec["seeds"], spec["gls"]
+        if spec.get("crawl_depth") and len(gls) == 1:
+            return self._crawl(job, [s for s in seeds if (s, gls[0]) not in done])
+        return expand_markets(seeds, gls, spec["concurrency"], lookahead=job.total, planner=planner,
+                              on_partial=on_partial, skip=done, analysis=spec.get("analysis", DEFAULT_ANALYSIS))
+
+    def _crawl(self, job: Job, seeds: list[str]):
+        spec = job.spec
+        gl = spec["gls"][0]
+        for seed in seeds:
+            with job.lock:
+                job.current = seed
+            buckets, job.run.crawl[seed] = crawl_keyword(seed, gl, spec["crawl_depth"], spec["query_budget"],
+                                                         spec["concurrency"], max_age=spec.get("max_age"),
+                                                         analysis=spec.get("analysis", DEFAULT_ANALYSIS))
+            yield seed, gl, buckets
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> JobQueue:
+    """The process-wide queue; jobs left unfinished by a previous process are resumed"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(JobStore())
+            _queue.resume_interrupted()
+        return _queue
@@ -0,0 +1,333 @@
+"""Keyword expansion engine used by the Streamlit app.
+
+Kept free of Streamlit so it can be imported, scripted and pointed at a
+local stub suggest server (set ``SUGGEST_URL``).
+"""
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from itertools import chain, zip_longest
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from metrics import metrics
+from suggest_cache import open_store
+from suggest_http import SuggestError, error_type, get_json
+
+SUGGEST_URL = os.environ.get("SUGGEST_URL", "https://suggestqueries.google.com/complete/search")
+DEFAULT_CONCURRENCY = int(os.environ.get("SUGGEST_CONCURRENCY", "16"))
+
+# ────────────────────────────
+## Modifier Categories
+# ────────────────────────────
+QUESTION_WORDS = ["what", "why", "how", "where", "when", "who", "which", "can", "will", "are", "is", "does", "do", "should", "would", "could"]
+PREPOSITIONS = ["for", "with", "without", "to", "near", "in", "on", "about", "versus", "vs", "from", "by", "at", "through", "during", "after", "before"]
+COMPARISONS = ["vs", "versus", "alternative", "alternatives", "compare", "comparison", "like", "similar", "better than", "instead of", "rather than"]
+INTENT_MODIFIERS = ["buy", "purchase", "cheap", "best", "review", "price", "cost", "free", "download", "tutorial", "guide", "tips", "how to"]
+TEMPORAL = ["2024", "2025", "latest", "new", "today", "now", "recent", "upcoming", "future", "trends"]
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+DIGITS = "0123456789"
+
+# Alphabet soup: every "<seed> <char>" prefix, then two-character prefixes
+# only below a first-level prefix that came back with a full page
+PAGE_SIZE = 10
+RELATED_FOLLOWUP_BUDGET = 36
+
+BUCKETS = ["Questions", "Prepositions", "Comparisons", "Commercial Intent", "Temporal", "Related Searches"]
+
+# ────────────────────────────
+## Analysis Types
+# ────────────────────────────
+# Analysis type -> ({bucket: query templates}, alphabet-soup follow-up budget).
+# Templates are formatted with the seed; buckets keep BUCKETS order.
+ANALYSIS_PLANS = {
+    "Complete Analysis": ({
+        "Questions": [f"{q} {{seed}}" for q in QUESTION_WORDS],
+        "Prepositions": [t for p in PREPOSITIONS for t in (f"{{seed}} {p}", f"{p} {{seed}}")],
+        "Comparisons": [f"{{seed}} {c}" for c in COMPARISONS],
+        "Commercial Intent": [t for i in INTENT_MODIFIERS for t in (f"{i} {{seed}}", f"{{seed}} {i}")],
+        "Temporal": [f"{{seed}} {t}" for t in TEMPORAL],
+        # Alphabet soup for related searches (second level: see related_followups)
+        "Related Searches": [f"{{seed}} {char}" for char in ALPHABET + DIGITS],
+    }, RELATED_FOLLOWUP_BUDGET),
+    # The highest-yield modifiers of each bucket and the most common first letters
+    "Quick Suggestions": ({
+        "Questions": [f"{q} {{seed}}" for q in ["what", "how", "why", "is", "can"]],
+        "Prepositions": [f"{{seed}} {p}" for p in ["for", "with", "near", "without"]],
+        "Comparisons": [f"{{seed}} {c}" for c in ["vs", "alternatives"]],
+        "Commercial Intent": ["best {seed}", "{seed} price", "{seed} review", "cheap {seed}"],
+        "Temporal": ["{seed} 2025"],
+        "Related Searches": [f"{{seed}} {char}" for char in "scpabmtd"],
+    }, 0),
+    # Every comparison modifier, buying signals, and alphabet soup after "vs",
+    # which lists the brands and products people compare the seed with
+    "Competitor Research": ({
+        "Comparisons": [f"{{seed}} {c}" for c in COMPARISONS],
+        "Commercial Intent": ["best {seed}", "{seed} review", "{seed} price", "{seed} cost", "cheap {seed}", "buy {seed}"],
+        "Related Searches": [f"{{seed}} vs {char}" for char in ALPHABET],
+    }, 12),
+    "Content Ideas": ({
+        "Questions": [f"{q} {{seed}}" for q in QUESTION_WORDS],
+        "Prepositions": [t for p in PREPOSITIONS for t in (f"{{seed}} {p}", f"{p} {{seed}}")],
+    }, 0),
+}
+DEFAULT_ANALYSIS = "Complete Analysis"
+
+# ────────────────────────────
+## Suggestion Fetching
+# ────────────────────────────
+cache = open_store()
+
+def configure_cache(store):
+    """Swap the suggestion store (see suggest_cache) used by google_autocomplete"""
+    global cache
+    cache = store
+
+def google_autocomplete(query: str, gl: str, hl: str = "en", max_age: float = None) -> list[str]:
+    """Suggestions for one query; ``max_age`` (seconds) reuses older cached ones instead of the cache TTL"""
+    cached = cache.get(query, gl, hl, max_age=max_age)
+    if cached is not None:
+        return cached
+
+    params = {"client": "firefox", "q": query, "gl": gl, "hl": hl}
+    started = time.perf_counter()
+    try:
+        suggestions = get_json(SUGGEST_URL, params, gl)[1]
+    except SuggestError as e:
+        metrics.observe_query(time.perf_counter() - started, f"failed_{error_type(e)}")
+        raise  # throttled past every retry: never pass that off as an empty result
+    except (requests.RequestException, ValueError, IndexError) as e:
+        metrics.observe_query(time.perf_counter() - started, error_type(e))
+        return []
+
+    metrics.observe_query(time.perf_counter() - started, "ok" if suggestions else "empty")
+    cache.put(query, gl, suggestions, hl)
+    return suggestions
+
+# ────────────────────────────
+## Query Plans
+# ────────────────────────────
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+class QueryPlanner:
+    """Fetch each distinct (query, gl) of a run once and share the result.
+
+    Modifiers that appear in several lists ("vs", "versus", "how to") and
+    seeds that produce the same query string map to one future; every bucket
+    that asked for it gets the same result. The most recent ``memory``
+    distinct queries are remembered, older repeats fall through to the
+    suggestion cache. With ``max_age`` (a refresh), cached suggestions
+    fetched within that many seconds are reused even past the cache TTL, so
+    only stale queries go to the network.
+    """
+
+    def __init__(self, memory: int = 8192, max_age: float = None):
+        self.memory = memory
+        self.max_age = max_age
+        self.planned = 0
+        self.issued = 0
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch_all(self, queries: list[str], gl: str, executor: ThreadPoolExecutor) -> list:
+        """Submit every query to the pool; returns futures in query order, one per distinct query"""
+        futures = []
+        with self._lock:
+            for q in queries:
+                key = (normalize_query(q), gl)
+                future = self._futures.get(key)
+                if future is None:
+                    future = self._futures[key] = executor.submit(google_autocomplete, key[0], gl, max_age=self.max_age)
+                    self.issued += 1
+                    if len(self._futures) > self.memory:
+                        self._futures.popitem(last=False)
+                else:
+                    self._futures.move_to_end(key)
+                futures.append(future)
+            self.planned += len(queries)
+        return futures
+
+    @property
+    def saved(self) -> int:
+        return self.planned - self.issued
+
+    def as_dict(self) -> dict:
+        return {"planned": self.planned, "issued": self.issued, "saved": self.saved}
+
+def build_query_plan(seed: str, analysis: str = DEFAULT_ANALYSIS) -> list[tuple[str, str]]:
+    """(bucket, query) pairs for one seed, in the order results are merged"""
+    templates, _ = ANALYSIS_PLANS[analysis]
+    return [(bucket, template.format(seed=seed)) for bucket, queries in templates.items() for template in queries]
+
+def plan_budget(analysis: str = DEFAULT_ANALYSIS) -> int:
+    """Most queries one seed can send under ``analysis``, follow-ups included"""
+    templates, followups = ANALYSIS_PLANS[analysis]
+    return sum(map(len, templates.values())) + followups
+
+def related_followups(plan: list[tuple[str, str]], results: list[list[str]],
+                      budget: int = RELATED_FOLLOWUP_BUDGET) -> list[tuple[str, str]]:
+    """Two-character alphabet-soup queries worth sending after the first level.
+
+    Walks the prefix trie one level down. A prefix whose page came back short
+    already lists every completion and is pruned; below a full page, only the
+    branches that its suggestions actually continue into are queried, busiest
+    branch first, up to ``budget`` queries.
+    """
+    branches = Counter()
+    for (bucket, query), suggestions in zip(plan, results):
+        if bucket != "Related Searches" or len(suggestions) < PAGE_SIZE:
+            continue
+        prefix = normalize_query(query)
+        for s in suggestions:
+            s = normalize_query(s)
+            if s.startswith(prefix) and len(s) > len(prefix) and not s[len(prefix)].isspace():
+                branches[prefix + s[len(prefix)]] += 1
+    return [("Related Searches", q) for q, _ in branches.most_common(budget)]
+
+def merge_buckets(plan: list[tuple[str, str]], results: list[list[str]]) -> dict[str, list[str]]:
+    buckets = {name: [] for name in BUCKETS}
+    related = []
+    for (bucket, _), suggestions in zip(plan, results):
+        if bucket == "Related Searches":
+            related.append(suggestions)
+        else:
+            buckets[bucket] += suggestions
+
+    # Round-robin across prefixes so the per-category limit samples every letter
+    buckets["Related Searches"] = [s for s in chain.from_iterable(zip_longest(*related)) if s is not None]
+
+    # Deduplicate all buckets
+    for key in buckets:
+        seen = set()
+        unique = []
+        for s in buckets[key]:
+            if s and s.lower() not in seen and len(s.strip()) > 0:
+                unique.append(s)
+                seen.add(s.lower())
+        buckets[key] = unique[:100]  # Limit per category
+
+    return buckets
+
+# ────────────────────────────
+## Expansion
+# ────────────────────────────
+def wait_for(plan, futures, on_partial=None, interval: float = 0.25) -> list[list[str]]:
+    """Results of ``futures`` in plan order.
+
+    With ``on_partial``, the calling thread wakes every ``interval`` seconds
+    and passes the buckets merged from the queries finished so far.
+    """
+    if on_partial is not None:
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=interval)
+            ready = [(entry, f.result()) for entry, f in zip(plan, futures) if f.done() and not f.exception()]
+            on_partial(merge_buckets([entry for entry, _ in ready], [r for _, r in ready]))
+    return [f.result() for f in futures]
+
+def resolve_plan(plan, futures, planner: QueryPlanner, gl: str, executor: ThreadPoolExecutor,
+                 followup_budget: int = RELATED_FOLLOWUP_BUDGET, on_partial=None):
+    """Wait for a submitted plan, then fetch its alphabet-soup follow-ups.
+
+    Returns the extended (plan, results) ready for merge_buckets.
+    """
+    results = wait_for(plan, futures, on_partial)
+    followups = related_followups(plan, results, followup_budget)
+    results += [f.result() for f in planner.fetch_all([q for _, q in followups], gl, executor)]
+    return plan + followups, results
+
+def get_related_searches(query: str, gl: str, concurrency: int = DEFAULT_CONCURRENCY) -> list[str]:
+    """Get related searches using alphabet soup method"""
+    plan = [entry for entry in build_query_plan(query) if entry[0] == "Related Searches"]
+    planner = QueryPlanner()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = planner.fetch_all([q for _, q in plan], gl, pool)
+        plan, results = resolve_plan(plan, futures, planner, gl, pool)
+    return merge_buckets(plan, results)["Related Searches"]
+
+def expand_keyword(seed: str, gl: str, concurrency: int = DEFAULT_CONCURRENCY,
+                   analysis: str = DEFAULT_ANALYSIS) -> dict[str, list[str]]:
+    """Fetch a seed's whole query plan in parallel and bucket the suggestions"""
+    plan = build_query_plan(seed, analysis)
+    planner = QueryPlanner()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = planner.fetch_all([q for _, q in plan], gl, pool)
+        plan, results = resolve_plan(plan, futures, planner, gl, pool, ANALYSIS_PLANS[analysis][1])
+    return merge_buckets(plan, results)
+
+def expand_keywords(seeds, gl: str, concurrency: int = DEFAULT_CONCURRENCY, lookahead: int = 4, on_error=None,
+                    planner: QueryPlanner = None, on_partial=None, analysis: str = DEFAULT_ANALYSIS):
+    """Expand many seeds over one shared pool, yielding (seed, buckets) in input order.
+
+    ``seeds`` may be any iterable and is consumed lazily. Up to ``lookahead``
+    seeds have their plans in flight at once, so the pool stays busy across
+    seed boundaries without queueing the whole run. If ``on_error`` is given,
+    a seed whose fetch fails is passed to ``on_error(seed, exc)`` and skipped
+    instead of aborting the run. Identical queries across the in-flight seeds
+    are fetched once through ``planner`` (pass one in to read its counts).
+    ``on_partial(seed, buckets)`` is called from the consuming thread with the
+    provisional buckets of the seed being waited on. ``analysis`` picks the
+    query plan and follow-up budget from ANALYSIS_PLANS.
+    """
+    jobs = ((seed, gl) for seed in seeds)
+    errors = (lambda seed, _, exc: on_error(seed, exc)) if on_error else None
+    partial = (lambda seed, _, buckets: on_partial(seed, buckets)) if on_partial else None
+    for seed, _, buckets in _expand(jobs, concurrency, lookahead, errors, planner, partial, analysis):
+        yield seed, buckets
+
+def expand_markets(seeds, gls: list[str], concurrency: int = DEFAULT_CONCURRENCY, lookahead: int = None,
+                   on_error=None, planner: QueryPlanner = None, on_partial=None, skip=(),
+                   analysis: str = DEFAULT_ANALYSIS):
+    """Expand every seed in every market over one shared pool, yielding (seed, gl, buckets).
+
+    Jobs go out seed by seed with all markets of a seed in flight together
+    (``lookahead`` defaults to two seeds' worth), so markets run side by side
+    rather than one after another. The per-market and global rate limits in
+    suggest_http keep the combined request rate in budget. ``on_error`` and
+    ``on_partial`` are called as ``(seed, gl, exc)`` and ``(seed, gl, buckets)``.
+    (seed, gl) pairs in ``skip`` (e.g. already checkpointed) are left out.
+    """
+    skip = set(skip)
+    jobs = ((seed, gl) for seed in seeds for gl in gls if (seed, gl) not in skip)
+    lookahead = 2 * len(gls) if lookahead is None else lookahead
+    yield from _expand(jobs, concurrency, lookahead, on_error, planner, on_partial, analysis)
+
+def _expand(jobs, concurrency, lookahead, on_error, planner, on_partial, analysis=DEFAULT_ANALYSIS):
+    planner = planner or QueryPlanner()
+    followups = ANALYSIS_PLANS[analysis][1]
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        pending = deque()
+        for seed, gl in jobs:
+            plan = build_query_plan(seed, analysis)
+            pending.append((seed, gl, plan, planner.fetch_all([q for _, q in plan], gl, pool)))
+            if len(pending) > lookahead:
+                yield from _collect(*pending.popleft(), planner, pool, on_error, on_partial, followups)
+        while pending:
+            yield from _collect(*pending.popleft(), planner, pool, on_error, on_partial, followups)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def bucket_rows(seed: str, buckets: dict[str, list[str]], max_suggestions: int = 100) -> list[dict]:
+    """Flatten one seed's buckets into result rows"""
+    return [
+        {"Seed": seed, "Category": bucket_name, "Keyword": s, "Length": len(s.split())}
+        for bucket_name, suggestions in buckets.items()
+        for s in suggestions[:max_suggestions]
+    ]
+
+def _collect(seed, gl, plan, futures, planner, executor, on_error=None, on_partial=None,
+             followups: int = RELATED_FOLLOWUP_BUDGET):
+    partial = (lambda buckets: on_partial(seed, gl, buckets)) if on_partial else None
+    try:
+        plan, results = resolve_plan(plan, futures, planner, gl, executor, followups, on_partial=partial)
+    except SuggestError as e:
+        if on_error is None:
+            raise
+        on_error(seed, gl, e)
+        return
+    metrics.record_plan(seed, plan)
+    yield seed, gl, merge_buckets(plan, results)
@@ -0,0 +1,73 @@
+"""Researching one seed set across several markets at once.
+
+Every market shares one worker pool, one query planner and the suggestion
+cache (see keyword_engine.expand_markets); suggest_http keeps the combined
+request rate under its global budget. A ``MarketRun`` holds one ResearchRun
+per market and compares them: which keywords show up in which markets, and
+which only in one.
+"""
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from results import ResearchRun
+
+
+class MarketRun:
+    def __init__(self, seeds: list[str], gls: list[str], categories: list[str]):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.seeds = seeds
+        self.gls = gls
+        self.gl = "+".join(gls)
+        self.categories = categories
+        self.created = time.time()
+        self.complete = False
+        self.planner = None
+        self.runs = {gl: ResearchRun(seeds, gl, categories) for gl in gls}
+        self._matrix = None
+
+    def add_buckets(self, seed: str, gl: str, buckets: dict[str, list[str]], max_suggestions: int = 100):
+        self.runs[gl].add_buckets(seed, buckets, max_suggestions)
+        self._matrix = None
+
+    def finish(self, planner: dict = None):
+        self.planner = planner
+        for run in self.runs.values():
+            run.finish(planner)
+        self.complete = True
+
+    @property
+    def matrix(self) -> pd.DataFrame:
+        """Keyword x market presence, with the number of markets and the only market (if just one)"""
+        if self._matrix is None:
+            parts = [run.frame["Keyword"].cat.categories.to_series() if run.complete else pd.Series(run.keywords, dtype=object)
+                     for run in self.runs.values()]
+            keywords = pd.concat(parts, ignore_index=True).str.lower().str.split().str.join(" ")
+            markets = np.repeat(np.arange(len(self.gls)), [len(p) for p in parts])
+            codes, uniques = pd.factorize(keywords)
+            presence = np.zeros((len(uniques), len(self.gls)), dtype=bool)
+            presence[codes, markets] = True
+            matrix = pd.DataFrame(presence, index=pd.Index(uniques, name="Keyword"), columns=self.gls)
+            matrix["Markets"] = presence.sum(axis=1)
+            matrix["Unique_To"] = np.where(matrix["Markets"] == 1, np.asarray(self.gls)[presence.argmax(axis=1)], "")
+            self._matrix = matrix.sort_values("Markets", ascending=False, kind="stable")
+        return self._matrix
+
+    def unique_to(self, gl: str) -> pd.Index:
+        """Keywords suggested in ``gl`` and no other market"""
+        matrix = self.matrix
+        return matrix.index[matrix["Unique_To"] == gl]
+
+    def preview(self, extra_rows: list[dict] = ()) -> pd.DataFrame:
+        """Rows of every market so far (plus provisional rows) for live display"""
+        frames = [run.preview() for run in self.runs.values() if len(run)]
+        if extra_rows:
+            frames.append(pd.DataFrame(extra_rows))
+        if not frames:
+            return pd.DataFrame(columns=["Keyword", "Category", "Seed", "Length"])
+        return pd.concat(frames, ignore_index=True)
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs.values())
@@ -0,0 +1,163 @@
+"""Process-wide instrumentation of the research hot path.
+
+Counts how every suggest query ended (suggestions, an empty list, or which
+kind of failure), why requests were retried, how many queries each bucket
+and seed planned, a latency histogram of the queries that went to the
+network, and wall-clock time per stage (fetch, scoring, clustering, charting,
+export, and each Streamlit script run). ``metrics`` is shared by the whole process, like the suggestion
+cache; read it with ``as_dict`` (JSON) or ``to_prometheus`` (text exposition
+format).
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_SEEDS = 500  # per-seed counts kept for the most recent seeds only
+
+# family -> (Prometheus metric name, label name, help text)
+COUNTERS = {
+    "outcomes": ("keyword_research_queries_total", "outcome", "Suggest queries by how they ended"),
+    "retries": ("keyword_research_retries_total", "reason", "Suggest requests retried, by cause"),
+    "buckets": ("keyword_research_planned_queries_total", "bucket", "Queries planned per result bucket"),
+    "seeds": ("keyword_research_seed_queries_total", "seed", "Queries planned per seed"),
+}
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the largest bound if past it)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.bounds[-1]
+
+    def as_dict(self) -> dict:
+        return {"buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+                "count": self.count, "sum": round(self.sum, 4),
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95)}
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.latency = Histogram()
+            self.counters = {family: Counter() for family in COUNTERS}
+            self.counters["seeds"] = OrderedDict()
+            self.stages = {}
+
+    def observe_query(self, seconds: float, outcome: str):
+        """One suggest query that went to the network"""
+        with self._lock:
+            self.latency.observe(seconds)
+            self.counters["outcomes"][outcome] += 1
+
+    def count(self, family: str, label: str, n: int = 1):
+        with self._lock:
+            self._count(family, label, n)
+
+    def _count(self, family: str, label: str, n: int):
+        counts = self.counters[family]
+        counts[label] = counts.get(label, 0) + n
+        if family == "seeds":
+            counts.move_to_end(label)
+            if len(counts) > MAX_SEEDS:
+                counts.popitem(last=False)
+
+    def record_plan(self, seed: str, plan: list[tuple[str, str]]):
+        """Queries a seed's (bucket, query) plan asked for, before deduplication"""
+        with self._lock:
+            for bucket, _ in plan:
+                self._count("buckets", bucket, 1)
+            self._count("seeds", seed, len(plan))
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - started)
+
+    def observe_stage(self, name: str, elapsed: float):
+        """Time spent in a stage that is not a single block, e.g. a whole script run"""
+        with self._lock:
+            count, total, _ = self.stages.get(name, (0, 0.0, 0.0))
+            self.stages[name] = (count + 1, total + elapsed, elapsed)
+
+    def as_dict(self, cache_stats=None) -> dict:
+        with self._lock:
+            data = {
+                "since": self.started,
+                "query_latency_seconds": self.latency.as_dict(),
+                **{family: dict(counts) for family, counts in self.counters.items()},
+                "stages": {name: {"count": c, "total_seconds": round(t, 4), "last_seconds": round(last, 4)}
+                           for name, (c, t, last) in self.stages.items()},
+            }
+        if cache_stats is not None:
+            data["cache"] = cache_stats.as_dict()
+        return data
+
+    def to_prometheus(self, cache_stats=None) -> str:
+        data = self.as_dict(cache_stats)
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"))
+
+        latency = data["query_latency_seconds"]
+        family("keyword_research_query_latency_seconds", "histogram", "Latency of suggest queries sent to the network, including rate-limit waits and retries")
+        cumulative = 0
+        for bound, n in latency["buckets"].items():
+            cumulative += n
+            lines.append(f'keyword_research_query_latency_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"keyword_research_query_latency_seconds_sum {latency['sum']}")
+        lines.append(f"keyword_research_query_latency_seconds_count {latency['count']}")
+
+        for key, (name, label, help_text) in COUNTERS.items():
+            family(name, "counter", help_text)
+            lines.extend(f'{name}{{{label}="{_escape(value)}"}} {n}' for value, n in data[key].items())
+
+        family("keyword_research_stage_seconds", "summary", "Wall-clock time per pipeline stage")
+        for name, stage in data["stages"].items():
+            lines.append(f'keyword_research_stage_seconds_sum{{stage="{_escape(name)}"}} {stage["total_seconds"]}')
+            lines.append(f'keyword_research_stage_seconds_count{{stage="{_escape(name)}"}} {stage["count"]}')
+
+        if "cache" in data:
+            cache = data["cache"]
+            for key in ("hits", "misses", "evictions"):
+                family(f"keyword_research_cache_{key}_total", "counter", f"Suggestion cache {key}")
+                lines.append(f"keyword_research_cache_{key}_total {cache[key]}")
+            family("keyword_research_cache_hit_ratio", "gauge", "Share of suggestion lookups served from the cache")
+            lines.append(f"keyword_research_cache_hit_ratio {cache['hit_ratio']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
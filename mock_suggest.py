@@ -0,0 +1,158 @@
+"""Local stand-in for the suggestqueries endpoint, for benchmarks and offline runs.
+
+Answers ``/complete/search?client=firefox&q=...`` with the same JSON shape
+as Google (``[query, [suggestion, ...]]``). Suggestions are deterministic per
+query: they continue the query text, and some pages come back short so the
+alphabet-soup pruning behaves as it does against the real service. Latency,
+server errors and throttling (429, random or above a requests-per-second
+cap) are configurable.
+
+    python mock_suggest.py --port 8765 --latency 0.05 --error-rate 0.01 --throttle-rate 0.02
+    SUGGEST_URL=http://127.0.0.1:8765/complete/search streamlit run autocomplete.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 10
+WORDS = ["price", "review", "near me", "for sale", "vs", "best", "cheap", "2025", "guide", "online",
+         "uk", "india", "meaning", "benefits", "cost", "types", "list", "app", "free", "how to use"]
+
+
+def suggestions_for(query: str, gl: str = "", short_page_rate: float = 0.3) -> list[str]:
+    """Deterministic suggestions for one query (and market)"""
+    digest = hashlib.blake2b(f"{gl}|{query}".encode(), digest_size=8).digest()
+    rng = random.Random(int.from_bytes(digest, "big"))
+    count = rng.randint(0, PAGE_SIZE - 1) if rng.random() < short_page_rate else PAGE_SIZE
+    words = rng.sample(WORDS, k=min(count, len(WORDS)))
+    # A query ending in a lone letter or digit is a prefix: complete that word
+    stem, _, last = query.rpartition(" ")
+    if stem and len(last) <= 2:
+        return [f"{query}{rng.choice('aeiou')}{rng.choice('nrst')} {w}" for w in words]
+    return [f"{query} {w}" for w in words]
+
+
+class MockSuggestServer:
+    """Threaded HTTP server; ``start()`` serves in the background and returns the suggest URL"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, max_qps: float = 0.0, retry_after: int = 1,
+                 short_page_rate: float = 0.3):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_qps = max_qps
+        self.retry_after = retry_after
+        self.short_page_rate = short_page_rate
+        self.statuses = Counter()
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/complete/search"
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _over_limit(self) -> bool:
+        if not self.max_qps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            self._recent.append(now)
+            return len(self._recent) > self.max_qps
+
+    def _respond(self, params: dict) -> tuple[int, dict, bytes]:
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        time.sleep(max(0.0, delay))
+        if self._over_limit() or random.random() < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}, b""
+        if random.random() < self.error_rate:
+            return random.choice((500, 503)), {}, b""
+        query = params.get("q", [""])[0]
+        gl = params.get("gl", [""])[0]
+        body = json.dumps([query, suggestions_for(query, gl, self.short_page_rate)]).encode()
+        return 200, {"Content-Type": "text/javascript; charset=UTF-8"}, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/complete/search":
+                    status, headers, body = 404, {}, b""
+                else:
+                    status, headers, body = server._respond(parse_qs(url.query))
+                with server._lock:
+                    server.statuses[status] += 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500/503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of random 429 responses")
+    parser.add_argument("--max-qps", type=float, default=0.0, help="answer 429 above this many requests/s (0 = no cap)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+
+def server_options(args) -> dict:
+    return {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate, "max_qps": args.max_qps, "retry_after": args.retry_after}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve mock autocomplete suggestions locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    server = MockSuggestServer(args.host, args.port, **server_options(args))
+    print(f"Serving mock suggestions at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Research runs kept in memory between Streamlit reruns.
+
+A ``ResearchRun`` stores its results column-wise while fetching: Seed,
+Category and Keyword are dictionary-encoded (small integer codes into one
+list of interned strings each) and Length is a packed integer array, so a
+keyword seen under several seeds or categories is held once. On first use
+the columns become one categorical DataFrame, stored category-major so each
+category view is a zero-copy slice, with scores joined per unique keyword
+and row indexes per seed and difficulty that are slices of a single
+permutation array. Near-duplicate keywords share a Cluster id and a canonical
+Cluster_Keyword (see ``clustering``). Filtering is a few NumPy operations and
+never touches the network. ``RunStore`` keeps the most recent runs of a
+session by run id.
+"""
+import sys
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from clustering import assign_clusters
+from metrics import metrics
+from scoring import score_keywords
+from word_cloud import word_frequencies
+
+COLUMNS = ["Seed", "Category", "Keyword", "Length"]
+DIFFICULTY_LEVELS = ["Easy", "Medium", "Hard"]
+
+
+def _positions_by_code(codes: np.ndarray, labels: list) -> dict:
+    """label -> row positions, each a slice (view) of one stable argsort"""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels) if bounds[i] < bounds[i + 1]}
+
+
+class ResearchRun:
+    def __init__(self, seeds: list[str], gl: str, categories: list[str]):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.seeds = seeds
+        self.gl = gl
+        self.categories = categories
+        self.created = time.time()
+        self.complete = False
+        self.planner = None
+        self.crawl = {}
+        self.changes = None  # against the previous snapshot of these seeds (see snapshots)
+
+        self.keywords = []
+        self._keyword_codes = {}
+        self._category_codes = {name: i for i, name in enumerate(categories)}
+        self._seed_codes = {}
+        self.seed_col = array("i")
+        self.category_col = array("b")
+        self.keyword_col = array("i")
+        self.length_col = array("h")
+        self._frame = None
+        self._indexes = None
+        self._word_frequencies = None
+
+    def add_buckets(self, seed: str, buckets: dict[str, list[str]], max_suggestions: int = 100):
+        """Append one seed's results"""
+        seed_code = self._seed_codes.setdefault(seed, len(self._seed_codes))
+        for category, suggestions in buckets.items():
+            category_code = self._category_codes[category]
+            for s in suggestions[:max_suggestions]:
+                code = self._keyword_codes.get(s)
+                if code is None:
+                    code = self._keyword_codes[s] = len(self.keywords)
+                    self.keywords.append(sys.intern(s))
+                self.seed_col.append(seed_code)
+                self.category_col.append(category_code)
+                self.keyword_col.append(code)
+                self.length_col.append(len(s.split()))
+        self._frame = None
+
+    def finish(self, planner: dict = None):
+        self.planner = planner
+        self.frame  # build and score once, while the user is still waiting anyway
+        self.complete = True  # only once the frame exists: a failed build leaves the rows to retry
+        # The frame now owns the data; drop the append-side encoders
+        self.keywords, self._keyword_codes = [], {}
+        self.seed_col, self.category_col, self.keyword_col, self.length_col = array("i"), array("b"), array("i"), array("h")
+
+    def _codes(self, col: array, dtype) -> np.ndarray:
+        return np.array(col, dtype=dtype)  # a copy: the array keeps growing while fetching
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All rows with scores and clusters; categorical, not copied per view"""
+        if self._frame is None:
+            category_codes = self._codes(self.category_col, np.int8)
+            order = np.argsort(category_codes, kind="stable")
+            seed_codes = self._codes(self.seed_col, np.int32)[order]
+            keyword_codes = self._codes(self.keyword_col, np.int32)[order]
+            with metrics.stage("scoring"):
+                scores = score_keywords(self.keywords) if self.keywords else None
+            frame = pd.DataFrame({
+                "Seed": pd.Categorical.from_codes(seed_codes, categories=list(self._seed_codes)),
+                "Category": pd.Categorical.from_codes(category_codes[order], categories=self.categories),
+                "Keyword": pd.Categorical.from_codes(keyword_codes, categories=self.keywords, validate=False),
+                "Length": self._codes(self.length_col, np.int16)[order],
+            })
+            if scores is not None:
+                difficulty = pd.Categorical(scores["Difficulty"].to_numpy(), categories=DIFFICULTY_LEVELS)
+                frame["Difficulty"] = pd.Categorical.from_codes(difficulty.codes[keyword_codes], categories=DIFFICULTY_LEVELS)
+                frame["Difficulty_Score"] = scores["Difficulty_Score"].to_numpy(np.int8)[keyword_codes]
+                frame["Volume_Indicator"] = scores["Volume_Indicator"].to_numpy(np.int8)[keyword_codes]
+                # Clustered per seed: a keyword found for two seeds is in one cluster of each
+                pairs, pair_of_row = np.unique(seed_codes.astype(np.int64) * len(self.keywords) + keyword_codes,
+                                               return_inverse=True)
+                pair_seeds, pair_keywords = pairs // len(self.keywords), pairs % len(self.keywords)
+                weights = np.bincount(pair_of_row, minlength=len(pairs))
+                with metrics.stage("clustering"):
+                    cluster, canonical = assign_clusters(np.asarray(self.keywords, dtype=object)[pair_keywords],
+                                                         seeds=np.asarray(list(self._seed_codes), dtype=object)[pair_seeds],
+                                                         weights=weights)
+                frame["Cluster"] = cluster[pair_of_row]
+                frame["Cluster_Keyword"] = pd.Categorical.from_codes(pair_keywords[canonical][pair_of_row],
+                                                                     categories=self.keywords, validate=False)
+            self._frame = frame
+            self._indexes = None
+        return self._frame
+
+    @property
+    def indexes(self) -> dict:
+        """Row positions per value of Seed, Category and Difficulty"""
+        if self._indexes is None:
+            frame = self.frame
+            self._indexes = {
+                column: _positions_by_code(frame[column].cat.codes.to_numpy(), list(frame[column].cat.categories))
+                for column in ("Seed", "Category", "Difficulty") if column in frame
+            }
+            self._indexes["Length"] = frame["Length"].to_numpy()
+        return self._indexes
+
+    @property
+    def word_frequencies(self) -> dict[str, int]:
+        """Word cloud tokens over every row, counted once per run"""
+        if self._word_frequencies is None:
+            keyword = self.frame["Keyword"]
+            counts = np.bincount(keyword.cat.codes.to_numpy(), minlength=len(keyword.cat.categories))
+            self._word_frequencies = word_frequencies(keyword.cat.categories, counts)
+        return self._word_frequencies
+
+    def category_view(self, category: str) -> pd.DataFrame:
+        """One category's rows: a contiguous slice of the frame, not a copy"""
+        positions = self.indexes["Category"].get(category)
+        if positions is None:
+            return self.frame.iloc[:0]
+        return self.frame.iloc[positions[0]:positions[-1] + 1]
+
+    def _positions(self, column: str, values) -> np.ndarray:
+        index = self.indexes[column]
+        parts = [index[v] for v in values if v in index]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def filter(self, seeds=None, categories=None, difficulty=None, length: tuple = None) -> pd.DataFrame:
+        """Rows matching every given filter (None or empty means no filter)"""
+        if categories and len(categories) == 1:
+            view = self.category_view(categories[0])
+            return view if self._all_match(view, seeds, difficulty, length) else self._mask_filter(seeds, categories, difficulty, length)
+        return self._mask_filter(seeds, categories, difficulty, length)
+
+    def _all_match(self, view, seeds, difficulty, length) -> bool:
+        return (not seeds and not difficulty
+                and (not length or view.empty or (length[0] <= view["Length"].min() and view["Length"].max() <= length[1])))
+
+    def _mask_filter(self, seeds, categories, difficulty, length) -> pd.DataFrame:
+        mask = np.ones(len(self.frame), dtype=bool)
+        for column, values in (("Seed", seeds), ("Category", categories), ("Difficulty", difficulty)):
+            if values:
+                selected = np.zeros_like(mask)
+                selected[self._positions(column, values)] = True
+                mask &= selected
+        if length:
+            lengths = self.indexes["Length"]
+            mask &= (lengths >= length[0]) & (lengths <= length[1])
+        return self.frame if mask.all() else self.frame[mask]
+
+    def preview(self, extra_rows: list[dict] = ()) -> pd.DataFrame:
+        """Plain frame of the rows so far (plus provisional rows) for live display"""
+        keywords = np.asarray(self.keywords, dtype=object)
+        seeds = np.asarray(list(self._seed_codes), dtype=object)
+        frame = pd.DataFrame({
+            "Keyword": keywords[self._codes(self.keyword_col, np.int32)],
+            "Category": np.asarray(self.categories, dtype=object)[self._codes(self.category_col, np.int8)],
+            "Seed": seeds[self._codes(self.seed_col, np.int32)],
+            "Length": self._codes(self.length_col, np.int16),
+        })
+        if extra_rows:
+            frame = pd.concat([frame, pd.DataFrame(extra_rows)[frame.columns]], ignore_index=True)
+        return frame
+
+    def __len__(self):
+        return len(self._frame) if self.complete else len(self.keyword_col)
+
+
+class RunStore:
+    """Most recent runs of a session, oldest evicted past ``max_runs``"""
+
+    def __init__(self, max_runs: int = 5):
+        self.max_runs = max_runs
+        self.runs = OrderedDict()
+        self.active = None
+
+    def add(self, run: ResearchRun) -> ResearchRun:
+        self.runs[run.run_id] = run
+        self.active = run.run_id
+        while len(self.runs) > self.max_runs:
+            self.runs.popitem(last=False)
+        return run
+
+    def get(self, run_id: str = None) -> ResearchRun:
+        return self.runs.get(run_id or self.active)
+
+    def __len__(self):
+        return len(self.runs)
@@ -0,0 +1,65 @@
+"""Heuristic keyword difficulty and search volume scoring.
+
+Scores are computed once per unique keyword with vectorized pandas/NumPy
+operations: keywords are split into tokens once, word-list membership is
+decided once per distinct token, and the per-keyword counts are summed back
+with ``np.bincount``.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+COMMON_WORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by", "from", "about"}
+BRAND_TERMS = ["google", "facebook", "amazon", "apple", "microsoft"]
+QUESTION_TERMS = {"what", "how", "why", "where", "when"}
+COMMERCIAL_TERMS = {"buy", "price", "cost", "cheap", "best", "review"}
+
+_BRAND = re.compile("|".join(map(re.escape, BRAND_TERMS)))  # substring match, like the original heuristic
+
+def score_keywords(keywords) -> pd.DataFrame:
+    """Score unique keywords; returns Difficulty, Difficulty_Score and Volume_Indicator indexed by keyword"""
+    unique = pd.Index(pd.unique(pd.Series(keywords, dtype=object)))
+    lower = pd.Series(unique, dtype=object).str.lower()
+    tokens = lower.str.split()
+    n_words = tokens.str.len().to_numpy()
+
+    exploded = tokens.explode().dropna()
+    rows = exploded.index.to_numpy()
+    codes, vocab = pd.factorize(exploded)
+    vocab = pd.Index(vocab)
+
+    def per_keyword(words):
+        hits = vocab.isin(list(words))
+        return np.bincount(rows, weights=hits[codes], minlength=len(unique))
+
+    # Simple scoring: longer phrases = easier, common words = harder
+    difficulty = np.clip(n_words * 10 - per_keyword(COMMON_WORDS).astype(int) * 5, 1, 100)
+    label = np.select([difficulty <= 30, difficulty <= 60], ["Easy", "Medium"], "Hard")
+
+    volume = (
+        50
+        + 30 * lower.str.contains(_BRAND).to_numpy()  # brand terms typically have higher volume
+        + 20 * (per_keyword(QUESTION_TERMS) > 0)  # question keywords often have good volume
+        + 25 * (per_keyword(COMMERCIAL_TERMS) > 0)  # commercial intent
+        - 10 * (n_words > 4)  # length penalty
+    )
+    volume = np.clip(volume, 10, 100)
+
+    return pd.DataFrame(
+        {"Difficulty": label, "Difficulty_Score": difficulty, "Volume_Indicator": volume},
+        index=unique,
+    )
+
+def analyze_keyword_difficulty(keywords: list[str]) -> dict:
+    """Simple keyword difficulty analysis based on length and common words"""
+    scores = score_keywords(keywords)
+    return {
+        keyword: {"score": int(score), "difficulty": label}
+        for keyword, score, label in zip(scores.index, scores["Difficulty_Score"], scores["Difficulty"])
+    }
+
+def extract_search_volume_indicators(keywords: list[str]) -> dict:
+    """Extract search volume indicators from keyword characteristics"""
+    scores = score_keywords(keywords)
+    return dict(zip(scores.index, scores["Volume_Indicator"].astype(int).tolist()))
@@ -0,0 +1,169 @@
+"""Versioned snapshots of research runs and what changed between them.
+
+Every finished run is saved as a snapshot keyed by its seed set (order and
+case do not matter), analysis type, market and date; running the same seeds
+again on the same day replaces that day's snapshot. Each row keeps the
+keyword's rank, its position within its seed and category. Comparing a snapshot with the
+latest one from an earlier date gives the new suggestions, the dropped ones
+and the ones whose rank moved. Together with a refresh (see
+``QueryPlanner(max_age=...)``), a repeated run only pays for the queries
+that went stale.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from keyword_engine import DEFAULT_ANALYSIS
+
+SNAPSHOT_DB = os.environ.get("SNAPSHOT_DB", ".cache/snapshots.sqlite3")
+MAX_SNAPSHOTS = int(os.environ.get("SNAPSHOT_MAX_VERSIONS", "52"))  # per seed set and market
+
+KEY_COLUMNS = ["Seed", "Category", "Keyword"]
+CHANGES = ["new", "dropped", "moved"]
+
+
+def normalize_seed(seed: str) -> str:
+    return " ".join(seed.lower().split())
+
+def seed_key(seeds, analysis: str = DEFAULT_ANALYSIS) -> str:
+    normalized = sorted({normalize_seed(seed) for seed in seeds})
+    return hashlib.blake2b("\n".join([analysis, *normalized]).encode(), digest_size=8).hexdigest()
+
+def bucket_ranks(seed: str, buckets: dict[str, list[str]], max_suggestions: int = 100):
+    """(seed, category, keyword, rank) rows of one seed's buckets, the seed normalized like ``seed_key``"""
+    seed = normalize_seed(seed)
+    for category, suggestions in buckets.items():
+        for rank, keyword in enumerate(suggestions[:max_suggestions], 1):
+            yield seed, category, keyword, rank
+
+def diff_rows(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """New, dropped and moved keywords between two snapshots' rows.
+
+    Rank_Change is positive when a keyword moved up (closer to the top).
+    """
+    # Same seed set, same key: "Electric Cars" and "electric cars" are one seed
+    old, new = (rows.assign(Seed=rows["Seed"].map(normalize_seed)) for rows in (old, new))
+    merged = old.rename(columns={"Rank": "Old_Rank"}).merge(
+        new.rename(columns={"Rank": "New_Rank"}), on=KEY_COLUMNS, how="outer")
+    old_rank, new_rank = merged["Old_Rank"], merged["New_Rank"]
+    change = np.select([old_rank.isna(), new_rank.isna(), old_rank != new_rank], CHANGES, "")
+    merged["Change"] = pd.Categorical(change, categories=CHANGES)
+    merged = merged[change != ""].astype({"Old_Rank": "Int32", "New_Rank": "Int32"})
+    merged["Rank_Change"] = merged["Old_Rank"] - merged["New_Rank"]
+    return merged.sort_values(["Change", "Seed", "Category", "New_Rank"], kind="stable", ignore_index=True)[
+        ["Change", *KEY_COLUMNS, "Old_Rank", "New_Rank", "Rank_Change"]]
+
+
+class Changes:
+    """What changed since the ``previous`` snapshot (a date string)"""
+
+    def __init__(self, previous: str, current: str, frame: pd.DataFrame):
+        self.previous = previous
+        self.current = current
+        self.frame = frame
+        counts = frame["Change"].value_counts()
+        self.counts = {change: int(counts.get(change, 0)) for change in CHANGES}
+
+    def summary(self) -> str:
+        return (f"{self.counts['new']:,} new, {self.counts['dropped']:,} dropped, "
+                f"{self.counts['moved']:,} moved since {self.previous}")
+
+
+class SnapshotStore:
+    def __init__(self, path: str = SNAPSHOT_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY,
+                    seed_key TEXT NOT NULL,
+                    gl TEXT NOT NULL,
+                    taken TEXT NOT NULL,
+                    seeds TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS snapshots_version ON snapshots (seed_key, gl, taken)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_rows (
+                    snapshot_id INTEGER NOT NULL,
+                    seed TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    rank INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS snapshot_rows_snapshot ON snapshot_rows (snapshot_id)")
+
+    def save(self, seeds: list[str], gl: str, rows, taken: str = None, analysis: str = DEFAULT_ANALYSIS) -> int:
+        """Store ``rows`` (seed, category, keyword, rank) as the snapshot of ``taken`` (default today)"""
+        taken = taken or date.today().isoformat()
+        key = seed_key(seeds, analysis)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete("seed_key = ? AND gl = ? AND taken = ?", (key, gl, taken))
+                snapshot_id = self._conn.execute(
+                    "INSERT INTO snapshots (seed_key, gl, taken, seeds, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, gl, taken, json.dumps(seeds), time.time())).lastrowid
+                self._conn.executemany("INSERT INTO snapshot_rows VALUES (?, ?, ?, ?, ?)",
+                                       ((snapshot_id, *row) for row in rows))
+                self._delete("seed_key = ? AND gl = ? AND id NOT IN "
+                             "(SELECT id FROM snapshots WHERE seed_key = ? AND gl = ? ORDER BY taken DESC LIMIT ?)",
+                             (key, gl, key, gl, MAX_SNAPSHOTS))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return snapshot_id
+
+    def _delete(self, where: str, params: tuple):
+        ids = [row[0] for row in self._conn.execute(f"SELECT id FROM snapshots WHERE {where}", params)]
+        for snapshot_id in ids:
+            self._conn.execute("DELETE FROM snapshot_rows WHERE snapshot_id = ?", (snapshot_id,))
+            self._conn.execute("DELETE FROM snapshots WHERE id = ?", (snapshot_id,))
+
+    def versions(self, seeds: list[str], gl: str, analysis: str = DEFAULT_ANALYSIS) -> list[tuple[int, str]]:
+        """(snapshot id, date) of a seed set in a market, newest first"""
+        with self._lock:
+            return self._conn.execute("SELECT id, taken FROM snapshots WHERE seed_key = ? AND gl = ? ORDER BY taken DESC",
+                                      (seed_key(seeds, analysis), gl)).fetchall()
+
+    def rows(self, snapshot_id: int) -> pd.DataFrame:
+        with self._lock:
+            rows = self._conn.execute("SELECT seed, category, keyword, rank FROM snapshot_rows WHERE snapshot_id = ?",
+                                      (snapshot_id,)).fetchall()
+        return pd.DataFrame(rows, columns=[*KEY_COLUMNS, "Rank"])
+
+    def changes(self, seeds: list[str], gl: str, taken: str = None, analysis: str = DEFAULT_ANALYSIS) -> Changes:
+        """The ``taken`` snapshot (default the latest) against the latest one before it, or None"""
+        versions = self.versions(seeds, gl, analysis)
+        if taken is not None:
+            versions = [v for v in versions if v[1] <= taken]
+        if len(versions) < 2:
+            return None
+        (current_id, current), (previous_id, previous) = versions[:2]
+        return Changes(previous, current, diff_rows(self.rows(previous_id), self.rows(current_id)))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> SnapshotStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore()
+        return _store
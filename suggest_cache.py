@@ -0,0 +1,217 @@
+"""Suggestion stores keyed by (query, gl, hl).
+
+``SQLiteStore`` persists suggestions on disk (WAL mode, safe to share between
+processes and replicas on the same volume); ``MemoryStore`` keeps them in an
+in-process LRU. Both expire entries after a per-entry TTL, cap their size with
+least-recently-used eviction and count hits and misses. Expired entries are
+kept for ``retain`` seconds after they were fetched, so a refresh can ask for
+anything fetched within a longer ``max_age`` instead of the TTL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_RETAIN = 30 * 86400
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evicted(self, n: int):
+        with self._lock:
+            self.evictions += n
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_ratio": self.hit_ratio}
+
+
+class MemoryStore:
+    """In-process LRU store; nothing survives a restart"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 retain: float = DEFAULT_RETAIN):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.retain = retain
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, gl: str, hl: str = "en", max_age: float = None):
+        """Suggestions within their TTL, or fetched less than ``max_age`` seconds ago if given"""
+        key = (query, gl, hl)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and (entry[1] > now if max_age is None else entry[0] > now - max_age):
+                self._data.move_to_end(key)
+                self.stats.record(True)
+                return entry[2]
+            if entry and entry[1] <= now and entry[0] <= now - self.retain:
+                del self._data[key]
+        self.stats.record(False)
+        return None
+
+    def put(self, query: str, gl: str, suggestions: list[str], hl: str = "en", ttl: float = None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[(query, gl, hl)] = (now, expires, list(suggestions))
+            self._data.move_to_end((query, gl, hl))
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.evicted(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteStore:
+    """On-disk store in a single SQLite file.
+
+    Each thread gets its own connection. Eviction runs every
+    ``evict_every`` writes and trims the table back to ``max_entries`` by
+    oldest ``last_used``.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL, evict_every: int = 500, retain: float = DEFAULT_RETAIN):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.retain = retain
+        self.evict_every = evict_every
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS suggestions (
+                query TEXT NOT NULL,
+                gl TEXT NOT NULL,
+                hl TEXT NOT NULL,
+                suggestions TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (query, gl, hl)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS suggestions_last_used ON suggestions (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, query: str, gl: str, hl: str = "en", max_age: float = None):
+        """Suggestions within their TTL, or fetched less than ``max_age`` seconds ago if given"""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT suggestions, expires_at, fetched_at FROM suggestions WHERE query = ? AND gl = ? AND hl = ?",
+            (query, gl, hl),
+        ).fetchone()
+        if row is None or (row[1] <= now if max_age is None else row[2] <= now - max_age):
+            self.stats.record(False)
+            return None
+        conn.execute(
+            "UPDATE suggestions SET last_used = ? WHERE query = ? AND gl = ? AND hl = ?",
+            (now, query, gl, hl),
+        )
+        self.stats.record(True)
+        return json.loads(row[0])
+
+    def put(self, query: str, gl: str, suggestions: list[str], hl: str = "en", ttl: float = None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO suggestions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (query, gl, hl, json.dumps(suggestions), now, expires, now),
+        )
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows past retention, then least-recently-used rows over the size cap"""
+        conn = self._conn()
+        now = time.time()
+        removed = conn.execute("DELETE FROM suggestions WHERE expires_at <= ? AND fetched_at <= ?",
+                               (now, now - self.retain)).rowcount
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM suggestions WHERE (query, gl, hl) IN "
+                "(SELECT query, gl, hl FROM suggestions ORDER BY last_used LIMIT ?)",
+                (excess,),
+            ).rowcount
+        if removed:
+            self.stats.evicted(removed)
+        return removed
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM suggestions").fetchone()[0]
+
+    def clear(self):
+        self._conn().execute("DELETE FROM suggestions")
+
+
+def open_store(path: str = None, **kwargs):
+    """Open the store named by ``path`` (or ``SUGGEST_CACHE``).
+
+    ``":memory:"`` selects the in-process LRU; anything else is a SQLite file.
+    """
+    path = path or os.environ.get("SUGGEST_CACHE", ".cache/suggestions.sqlite3")
+    max_entries = int(os.environ.get("SUGGEST_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    ttl = float(os.environ.get("SUGGEST_CACHE_TTL", DEFAULT_TTL))
+    retain = float(os.environ.get("SUGGEST_CACHE_RETAIN", DEFAULT_RETAIN))
+    kwargs.setdefault("max_entries", max_entries)
+    kwargs.setdefault("ttl", ttl)
+    kwargs.setdefault("retain", retain)
+    if path == ":memory:":
+        return MemoryStore(**kwargs)
+    return SQLiteStore(path, **kwargs)
@@ -0,0 +1,137 @@
+"""Shared HTTP plumbing for the suggest endpoints.
+
+One keep-alive connection pool for the whole process, a token-bucket rate
+limiter per (endpoint host, gl) under a global one per host (so researching
+many markets at once stays inside one overall request budget), and retries
+with exponential backoff and jitter on 429/5xx and transport errors.
+"""
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+RATE_PER_SECOND = float(os.environ.get("SUGGEST_RATE", "20"))
+BURST = int(os.environ.get("SUGGEST_BURST", "20"))
+GLOBAL_RATE_PER_SECOND = float(os.environ.get("SUGGEST_GLOBAL_RATE", "40"))
+GLOBAL_BURST = int(os.environ.get("SUGGEST_GLOBAL_BURST", "40"))
+MAX_RETRIES = int(os.environ.get("SUGGEST_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+TIMEOUT = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SuggestError(Exception):
+    """A query still failed after every retry (throttled or upstream down)"""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller of this bucket back, e.g. after a 429"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+_session = None
+_buckets = {}
+_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=64)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def get_bucket(url: str, gl: str = None) -> TokenBucket:
+    """The limiter for one market of an endpoint, or with no ``gl`` the endpoint's global one"""
+    key = (urlparse(url).netloc, gl)
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            if gl is None:
+                bucket = _buckets[key] = TokenBucket(GLOBAL_RATE_PER_SECOND, GLOBAL_BURST)
+            else:
+                bucket = _buckets[key] = TokenBucket(RATE_PER_SECOND, BURST)
+        return bucket
+
+def error_type(exc: Exception) -> str:
+    """Short label for why a request failed, for metrics"""
+    if isinstance(exc, SuggestError) and exc.__cause__ is not None:
+        exc = exc.__cause__
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        return "connection"
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, (ValueError, IndexError)):
+        return "bad_response"
+    return type(exc).__name__
+
+def _backoff(attempt: int, retry_after: str = None) -> float:
+    if retry_after and retry_after.isdigit():
+        return min(BACKOFF_CAP, float(retry_after))
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))  # full jitter
+
+def get_json(url: str, params: dict, gl: str):
+    """Rate-limited GET returning the decoded JSON body.
+
+    Raises SuggestError once retries are exhausted and requests.HTTPError for
+    non-retryable statuses.
+    """
+    session = get_session()
+    bucket = get_bucket(url, gl)
+    host_bucket = get_bucket(url)
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        host_bucket.acquire()
+        try:
+            r = session.get(url, params=params, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+            delay = _backoff(attempt)
+        else:
+            if r.status_code not in RETRY_STATUSES:
+                r.raise_for_status()
+                return r.json()
+            error = requests.HTTPError(f"{r.status_code} for {r.url}", response=r)
+            delay = _backoff(attempt, r.headers.get("Retry-After"))
+            if r.status_code == 429:
+                # Throttling is per client, not per market: every market backs off
+                host_bucket.pause(delay)
+        if attempt < MAX_RETRIES:
+            metrics.count("retries", error_type(error))
+            time.sleep(delay)
+    raise SuggestError(f"{params.get('q')!r} failed after {MAX_RETRIES + 1} attempts: {error}") from error
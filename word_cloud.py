@@ -0,0 +1,90 @@
+"""Word clouds rendered from a cached frequency table.
+
+Token frequencies are counted once per run over its unique keywords
+(weighted by how many rows each keyword has), tokenized like
+``WordCloud.process_text``. The cloud is drawn straight to a PNG with
+``WordCloud.to_image`` (no matplotlib figure), on a background thread, and
+kept by a hash of the top-``MAX_WORDS`` frequency table, so the same
+keywords are never rendered twice.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import metrics
+
+MAX_WORDS = 100
+WIDTH, HEIGHT, SCALE = 800, 400, 1.5
+MAX_RENDERS = 16  # cached PNGs, a few hundred KB each
+# viridis, sampled: the colormap the cloud always used, without matplotlib.pyplot
+PALETTE = ["#440154", "#482878", "#3e4989", "#31688e", "#26828e", "#1f9e89", "#35b779", "#6ece58", "#b5de2b"]
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="word-cloud")
+_renders = OrderedDict()
+_lock = threading.Lock()
+
+
+def word_frequencies(keywords, counts=None, max_words: int = MAX_WORDS) -> dict[str, int]:
+    """The ``max_words`` most frequent tokens of ``keywords`` (each counted ``counts`` times)"""
+    from wordcloud import STOPWORDS
+
+    if not len(keywords):
+        return {}
+    keywords = pd.Series(np.asarray(keywords, dtype=object))
+    counts = np.ones(len(keywords), dtype=np.int64) if counts is None else np.asarray(counts)
+    words = keywords.str.lower().str.findall(r"\w[\w']+")
+    tokens = words.explode().dropna()
+    tokens = tokens.str.replace(r"'s$", "", regex=True)
+    weights = counts[tokens.index.to_numpy()]
+    keep = ~tokens.isin(STOPWORDS).to_numpy() & ~tokens.str.isdigit().to_numpy()
+    codes, vocab = pd.factorize(tokens.to_numpy()[keep])
+    totals = pd.Series(np.bincount(codes, weights=weights[keep]).astype(np.int64), index=vocab)
+    # Fold plurals into their singular when both occur
+    present = set(vocab)
+    plurals = {w: w[:-1] for w in vocab if w.endswith("s") and not w.endswith("ss") and w[:-1] in present}
+    if plurals:
+        totals = totals.rename(plurals).groupby(level=0, sort=False).sum()
+    top = totals.sort_values(ascending=False, kind="stable").head(max_words)
+    return {word: int(n) for word, n in top.items()}
+
+def frequency_hash(frequencies: dict[str, int]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for word, n in sorted(frequencies.items()):
+        digest.update(f"{word}\t{n}\n".encode())
+    return digest.hexdigest()
+
+def _color(word, font_size, position, orientation, random_state=None, **kwargs) -> str:
+    return PALETTE[random_state.randint(0, len(PALETTE) - 1)]
+
+def render_png(frequencies: dict[str, int]) -> bytes:
+    from wordcloud import WordCloud
+
+    with metrics.stage("word_cloud"):
+        seed = int(frequency_hash(frequencies), 16) % (1 << 31)  # same table, same layout
+        cloud = WordCloud(width=WIDTH, height=HEIGHT, scale=SCALE, background_color="white",
+                          max_words=MAX_WORDS, color_func=_color, random_state=seed)
+        buffer = io.BytesIO()
+        cloud.generate_from_frequencies(frequencies).to_image().save(buffer, format="PNG")
+        return buffer.getvalue()
+
+def render_async(frequencies: dict[str, int], retry: bool = False) -> Future:
+    """The PNG of ``frequencies``: a finished future if it was rendered before, else a running one.
+
+    A failed render stays cached, so callers can show its error; only
+    ``retry`` starts it again.
+    """
+    key = frequency_hash(frequencies)
+    with _lock:
+        future = _renders.get(key)
+        if future is not None and not (retry and future.done() and future.exception()):
+            _renders.move_to_end(key)
+            return future
+        future = _renders[key] = _pool.submit(render_png, frequencies)
+        while len(_renders) > MAX_RENDERS:
+            _renders.popitem(last=False)
+    return future